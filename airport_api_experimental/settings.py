@@ -167,6 +167,33 @@ SPECTACULAR_SETTINGS = {
     },
 }
 
+# Seat holds taken before ordering: storage backend, lifetime and sweep interval in seconds
+SEAT_HOLD_BACKEND = "airport_system.seat_holds.DatabaseSeatHoldBackend"
+SEAT_HOLD_TTL = 300
+SEAT_HOLD_SWEEP_INTERVAL = 60
+# Seats one user may hold at a time on one flight
+SEAT_HOLD_MAX_PER_USER = 10
+
+# Let geocoding.locate_city() ask Nominatim for cities missing from the gazetteer, when a city
+# is saved or a distance job resolved; import_gazetteer never goes to the network
+GEOCODING_NETWORK_FALLBACK = True
+# Leave distances of routes with unlocated cities pending for the resolve_route_distances workers
+ROUTE_DISTANCE_ASYNC = True
+# City pair distances kept in memory by each process, on top of the CityPairDistance table
+CITY_DISTANCE_CACHE_SIZE = 4096
+# Seconds an in-memory airport index is served before it's rebuilt, saving an airport rebuilds it at once
+AIRPORT_INDEX_TTL = 300
+# Seconds an in-memory flight graph for itinerary search is served before it's rebuilt
+ROUTE_GRAPH_TTL = 300
+# Shortest and longest wait between two flights of an itinerary
+ITINERARY_MIN_CONNECTION_MINUTES = 45
+ITINERARY_MAX_LAYOVER_HOURS = 24
+# Also match misspelled city and country names in the route filters, needs PostgreSQL with
+# the pg_trgm extension and django.contrib.postgres in INSTALLED_APPS
+ROUTE_SEARCH_TRIGRAM = False
+# Seconds an in-memory autocomplete index is served before it's rebuilt, saving an airport or a city rebuilds it at once
+AUTOCOMPLETE_INDEX_TTL = 300
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
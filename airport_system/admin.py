@@ -10,7 +10,7 @@ from .models import (
     Airline,
     Flight,
     Order,
-    Ticket, Seat, AirlineRating, Crew
+    Ticket, Seat, AirlineRating, Crew, GazetteerEntry, DistanceJob
 )
 
 
@@ -26,6 +26,18 @@ class AirportAdmin(admin.ModelAdmin):
     search_fields = ("name",)
 
 
+@admin.register(GazetteerEntry)
+class GazetteerEntryAdmin(admin.ModelAdmin):
+    list_display = ("city", "country", "latitude", "longitude")
+    search_fields = ("city", "country")
+
+
+@admin.register(DistanceJob)
+class DistanceJobAdmin(admin.ModelAdmin):
+    list_display = ("route", "status", "attempts", "run_after", "last_error")
+    list_filter = ("status",)
+
+
 @admin.register(Route)
 class RouteAdmin(admin.ModelAdmin):
     list_display = ("source", "emergent_destination")
@@ -50,6 +62,7 @@ class RatingInline(admin.StackedInline):
 @admin.register(Airline)
 class AirlineAdmin(admin.ModelAdmin):
     list_display = ("name", "headquarter", "web_site_address", "iata_icao", "url_logo", "overall_rating")
+    list_select_related = ("rating_aggregate",)
     inlines = [
         RatingInline,
     ]
@@ -64,7 +77,7 @@ class RatingAdmin(admin.ModelAdmin):
 
 @admin.register(Airplane)
 class AirplaneAdmin(admin.ModelAdmin):
-    readonly_fields = ["total_rows"]
+    readonly_fields = ["total_rows", "seat_layout"]
 
     @admin.display(description="total_rows")
     def total_rows(self, obj):
@@ -94,6 +107,7 @@ class SeatAdmin(admin.ModelAdmin):
 class FlightAdmin(admin.ModelAdmin):
     list_display = ("route", "airplane", "departure_time", "real_arrival_time", "estimated_arrival_time")
     list_filter = ("route",)
+    readonly_fields = ("seats_total", "seats_sold")
 
 
 @admin.register(Ticket)
@@ -0,0 +1,126 @@
+"""In-memory k-d tree of airport positions for nearest airport lookups.
+
+Positions are kept as points on the unit sphere, the straight line distance
+between two of them grows with the great-circle distance, so the tree needs
+no special care around the poles or the antimeridian.
+"""
+import heapq
+import math
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+
+from airport_system.distances import ENDPOINT_COLUMNS, airport_coordinates
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def to_unit_vector(latitude, longitude):
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+    return (
+        math.cos(latitude) * math.cos(longitude),
+        math.cos(latitude) * math.sin(longitude),
+        math.sin(latitude),
+    )
+
+
+def midpoint(source, destination):
+    """Great-circle midpoint of two (latitude, longitude) points."""
+    x, y, z = (a + b for a, b in zip(to_unit_vector(*source), to_unit_vector(*destination)))
+    return math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))
+
+
+class AirportIndex:
+    def __init__(self, airports):
+        # airports are (airport id, latitude, longitude)
+        self._ids = [airport_id for airport_id, _, _ in airports]
+        self._points = [to_unit_vector(latitude, longitude) for _, latitude, longitude in airports]
+        self._root = self._build(list(range(len(self._points))), 0)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _build(self, indexes, depth):
+        if not indexes:
+            return None
+        axis = depth % 3
+        indexes.sort(key=lambda index: self._points[index][axis])
+        median = len(indexes) // 2
+        return (
+            indexes[median],
+            axis,
+            self._build(indexes[:median], depth + 1),
+            self._build(indexes[median + 1:], depth + 1),
+        )
+
+    def nearest(self, latitude, longitude, k=5, exclude=()):
+        """Up to k (airport id, great-circle km) pairs, the nearest first."""
+        target = to_unit_vector(latitude, longitude)
+        # max-heap of the best candidates so far, as (-squared chord, index)
+        best = []
+
+        def visit(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            point = self._points[index]
+            squared = sum((a - b) ** 2 for a, b in zip(point, target))
+            if self._ids[index] not in exclude:
+                if len(best) < k:
+                    heapq.heappush(best, (-squared, index))
+                elif squared < -best[0][0]:
+                    heapq.heapreplace(best, (-squared, index))
+
+            offset = target[axis] - point[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            visit(near)
+            # the far side can only help if the splitting plane is closer than the worst candidate
+            if len(best) < k or offset * offset < -best[0][0]:
+                visit(far)
+
+        if k > 0:
+            visit(self._root)
+        return [
+            (self._ids[index], 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(-squared) / 2)))
+            for squared, index in sorted(best, reverse=True)
+        ]
+
+    @classmethod
+    def from_database(cls):
+        Airport = apps.get_model("airport_system", "Airport")
+
+        airports = []
+        for airport_id, *columns in Airport.objects.values_list("pk", *ENDPOINT_COLUMNS):
+            coordinates = airport_coordinates(*columns)
+            if coordinates is not None:
+                airports.append((airport_id, *coordinates))
+        return cls(airports)
+
+
+_index = None
+_built_at = 0
+_lock = threading.Lock()
+
+
+def get_airport_index():
+    """The index of this process, rebuilt after an invalidation or AIRPORT_INDEX_TTL seconds.
+
+    The TTL bounds how long other processes serve positions changed elsewhere.
+    """
+    global _index, _built_at
+
+    with _lock:
+        if _index is None or time.monotonic() - _built_at > getattr(settings, "AIRPORT_INDEX_TTL", 300):
+            _index = AirportIndex.from_database()
+            _built_at = time.monotonic()
+        return _index
+
+
+def invalidate_airport_index():
+    global _index
+
+    with _lock:
+        _index = None
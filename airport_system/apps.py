@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AirportSystemConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "airport_system"
+
+    def ready(self):
+        from airport_system import signals  # noqa: F401
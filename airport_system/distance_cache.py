@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+from geopy.distance import geodesic
+
+from airport_system.distances import ELLIPSOID
+
+
+class CityPairDistanceCache:
+    """Symmetric city to city distances, an in-process LRU over the CityPairDistance table.
+
+    Entries remember the coordinates they were computed from. An entry other
+    processes invalidated is recomputed on its next read here.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.model = apps.get_model("airport_system", "CityPairDistance")
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def distance(self, city, other_city):
+        """Whole kilometres between the cities, -1 if one of them isn't located."""
+        if city.pk > other_city.pk:
+            city, other_city = other_city, city
+        key = (city.pk, other_city.pk)
+        coordinates = (city.coordinates, other_city.coordinates)
+        if None in coordinates:
+            return -1
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == coordinates:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        distance = self.model.objects.filter(city_a_id=key[0], city_b_id=key[1]).values_list(
+            "distance", flat=True
+        ).first()
+        if distance is None:
+            distance = int(geodesic(*coordinates, ellipsoid=ELLIPSOID).kilometers)
+            self.model.objects.get_or_create(city_a_id=key[0], city_b_id=key[1], defaults={"distance": distance})
+
+        with self._lock:
+            self._entries[key] = (coordinates, distance)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return distance
+
+    def invalidate_city(self, city_id):
+        self.model.objects.filter(Q(city_a_id=city_id) | Q(city_b_id=city_id)).delete()
+        with self._lock:
+            for key in [key for key in self._entries if city_id in key]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+def get_distance_cache():
+    global _cache
+
+    with _lock:
+        if _cache is None:
+            _cache = CityPairDistanceCache(getattr(settings, "CITY_DISTANCE_CACHE_SIZE", 4096))
+        return _cache
@@ -0,0 +1,128 @@
+"""Database backed queue of routes waiting for their distance.
+
+Route.save() enqueues a route when one of its cities isn't located yet, the
+resolve_route_distances command runs the workers taking the jobs.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from geopy.exc import GeopyError
+
+
+def is_enabled():
+    return getattr(settings, "ROUTE_DISTANCE_ASYNC", False)
+
+
+def enqueue(route):
+    """Queue the route unless it already has a job.
+
+    A pending or running job reads the route when it runs and keeps its
+    attempts, a failed one starts over.
+    """
+    DistanceJob = apps.get_model("airport_system", "DistanceJob")
+
+    job, created = DistanceJob.objects.get_or_create(route=route)
+    if not created and job.status == "failed":
+        DistanceJob.objects.filter(pk=job.pk).update(
+            status="pending", attempts=0, run_after=timezone.now(), last_error=""
+        )
+
+
+def claim(limit, stale_after):
+    """Mark up to limit due jobs as running and return their ids.
+
+    Jobs left running longer than stale_after by a dead worker are taken again.
+    """
+    DistanceJob = apps.get_model("airport_system", "DistanceJob")
+    now = timezone.now()
+
+    with transaction.atomic():
+        job_ids = list(
+            DistanceJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status="pending", run_after__lte=now)
+                | Q(status="running", claimed_at__lt=now - stale_after)
+            )
+            .order_by("run_after")
+            .values_list("pk", flat=True)[:limit]
+        )
+        DistanceJob.objects.filter(pk__in=job_ids).update(status="running", claimed_at=now)
+    return job_ids
+
+
+def resolve(job_id, max_attempts, retry_delay):
+    """Locate the cities of the job's route and store its distance, True when it's done.
+
+    A job that can't be resolved is retried with an exponential backoff, after
+    max_attempts it's marked failed and the route gets the -1 distance.
+    """
+    DistanceJob = apps.get_model("airport_system", "DistanceJob")
+    Route = apps.get_model("airport_system", "Route")
+
+    job = DistanceJob.objects.select_related(
+        "route__source__closest_big_city__country",
+        "route__standard_destination__closest_big_city__country",
+    ).get(pk=job_id)
+    route = job.route
+
+    try:
+        for airport in (route.source, route.standard_destination):
+            city = airport.closest_big_city
+            if city.coordinates is None and city.locate() is not None:
+                city.save(update_fields=["latitude", "longitude"])
+        distance = route.calculate_distance()
+        error = "" if distance != -1 else "A city of the route could not be located."
+    except GeopyError as exc:
+        distance, error = -1, f"Geocoding failed: {exc!r}"
+    except Exception as exc:
+        # any other failure is retried like a geocoding one, the worker goes on
+        distance, error = -1, f"Distance calculation failed: {exc!r}"
+
+    if distance != -1:
+        with transaction.atomic():
+            Route.objects.filter(pk=route.pk).update(distance=distance)
+            job.delete()
+        return True
+
+    job.attempts += 1
+    job.last_error = error
+    if job.attempts >= max_attempts:
+        job.status = "failed"
+        Route.objects.filter(pk=route.pk).update(distance=-1)
+    else:
+        job.status = "pending"
+        job.run_after = timezone.now() + retry_delay * 2 ** (job.attempts - 1)
+    job.save()
+    return False
+
+
+class DistanceWorkerPool:
+    """Resolves claimed jobs with at most workers threads at a time."""
+
+    def __init__(self, workers=4, max_attempts=5, retry_delay=timedelta(minutes=1), stale_after=timedelta(minutes=10)):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+
+    def run_once(self):
+        """Resolve one round of due jobs, returns (resolved, processed)."""
+        job_ids = claim(self.workers, self.stale_after)
+        if self.workers == 1:
+            results = [resolve(job_id, self.max_attempts, self.retry_delay) for job_id in job_ids]
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(self._resolve_in_thread, job_ids))
+        return sum(results), len(results)
+
+    def _resolve_in_thread(self, job_id):
+        try:
+            return resolve(job_id, self.max_attempts, self.retry_delay)
+        finally:
+            # every thread opens its own connection
+            close_old_connections()
@@ -0,0 +1,113 @@
+"""Route distances for many routes at once.
+
+The distances are computed in one vectorized NumPy pass with Lambert's
+formula on ELLIPSOID, the ellipsoid of every distance of the app. Up to
+LAMBERT_REACH km it stays within LAMBERT_MARGIN of geopy's geodesic(), pairs
+whose whole kilometres that could change, or farther apart, go through
+geodesic(), so every distance equals the one Route.calculate_distance() gives.
+"""
+import numpy as np
+from django.db import transaction
+from geopy.distance import ELLIPSOIDS, geodesic
+
+
+# geopy name of the ellipsoid of every distance, the city pair cache and Route import it
+ELLIPSOID = "GRS-67"
+UPDATE_BATCH_SIZE = 1000
+# Lambert's error against geodesic() stays under 0.06 km up to 15000 km
+LAMBERT_REACH = 15000
+LAMBERT_MARGIN = 0.1
+
+ENDPOINT_COLUMNS = ("latitude", "longitude", "closest_big_city__latitude", "closest_big_city__longitude")
+
+
+def _lambert_distances(latitudes1, longitudes1, latitudes2, longitudes2):
+    major, _, flattening = ELLIPSOIDS[ELLIPSOID]
+    latitudes1, longitudes1, latitudes2, longitudes2 = (
+        np.radians(values) for values in (latitudes1, longitudes1, latitudes2, longitudes2)
+    )
+
+    # reduced latitudes, then the central angle between them with the haversine formula
+    beta1 = np.arctan((1 - flattening) * np.tan(latitudes1))
+    beta2 = np.arctan((1 - flattening) * np.tan(latitudes2))
+    haversine = (
+        np.sin((beta2 - beta1) / 2) ** 2
+        + np.cos(beta1) * np.cos(beta2) * np.sin((longitudes2 - longitudes1) / 2) ** 2
+    )
+    sigma = 2 * np.arcsin(np.sqrt(np.clip(haversine, 0, 1)))
+
+    p = (beta1 + beta2) / 2
+    q = (beta2 - beta1) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = (sigma - np.sin(sigma)) * np.sin(p) ** 2 * np.cos(q) ** 2 / np.cos(sigma / 2) ** 2
+        y = (sigma + np.sin(sigma)) * np.cos(p) ** 2 * np.sin(q) ** 2 / np.sin(sigma / 2) ** 2
+        distances = major * (sigma - flattening / 2 * (x + y))
+
+    # same point: both correction terms are 0 / 0
+    return np.where(sigma == 0, 0.0, distances)
+
+
+def geodesic_distances(sources, destinations):
+    """Whole kilometres between (latitude, longitude) pairs, -1 where a side is None."""
+    if not sources:
+        return []
+    sources = np.array([source or (None, None) for source in sources], dtype=float)
+    destinations = np.array([destination or (None, None) for destination in destinations], dtype=float)
+
+    distances = _lambert_distances(sources[:, 0], sources[:, 1], destinations[:, 0], destinations[:, 1])
+    fractions = distances % 1
+    unsure = ~np.isnan(distances) & (
+        (distances > LAMBERT_REACH) | (fractions < LAMBERT_MARGIN) | (fractions > 1 - LAMBERT_MARGIN)
+    )
+
+    kilometres = np.where(np.isnan(distances), -1, distances).astype(int)
+    for index in np.flatnonzero(unsure):
+        # close to a whole kilometre, let geodesic() decide which side like Route.calculate_distance()
+        kilometres[index] = int(
+            geodesic(tuple(sources[index]), tuple(destinations[index]), ellipsoid=ELLIPSOID).kilometers
+        )
+    return kilometres.tolist()
+
+
+def airport_coordinates(latitude, longitude, city_latitude, city_longitude):
+    # airport position first, its closest big city otherwise, like Airport.coordinates
+    if latitude is not None and longitude is not None:
+        return latitude, longitude
+    if city_latitude is not None and city_longitude is not None:
+        return city_latitude, city_longitude
+    return None
+
+
+def route_distances(routes):
+    """Distances of Route instances, the airports and cities should be select_related."""
+    return geodesic_distances(
+        [route.source.coordinates for route in routes],
+        [route.standard_destination.coordinates for route in routes],
+    )
+
+
+def recompute_route_distances(routes, batch_size=UPDATE_BATCH_SIZE):
+    """Recompute Route.distance of a Route queryset, returns (updated, unresolved).
+
+    The coordinates of every route are read in one query and computed in one
+    pass, only the changed distances are written back.
+    """
+    columns = [f"source__{column}" for column in ENDPOINT_COLUMNS]
+    columns += [f"standard_destination__{column}" for column in ENDPOINT_COLUMNS]
+    rows = list(routes.order_by("pk").values_list("pk", "distance", *columns))
+
+    distances = geodesic_distances(
+        [airport_coordinates(*row[2:6]) for row in rows],
+        [airport_coordinates(*row[6:10]) for row in rows],
+    )
+
+    model = routes.model
+    changed = [
+        model(pk=row[0], distance=distance)
+        for row, distance in zip(rows, distances)
+        if row[1] != distance
+    ]
+    with transaction.atomic():
+        model.objects.bulk_update(changed, ["distance"], batch_size=batch_size)
+
+    return len(changed), distances.count(-1)
@@ -0,0 +1,84 @@
+import csv
+import os
+import unicodedata
+
+from django.apps import apps
+from django.conf import settings
+from geopy.exc import GeocoderServiceError
+from geopy.geocoders import Nominatim
+
+
+BUNDLED_GAZETTEER = os.path.join(os.path.dirname(__file__), "data", "gazetteer.csv")
+
+# Spellings of a country normalizing to something else than the gazetteer name
+COUNTRY_ALIASES = {
+    "usa": "united states",
+    "us": "united states",
+    "united states of america": "united states",
+    "uk": "united kingdom",
+    "great britain": "united kingdom",
+    "uae": "united arab emirates",
+}
+
+
+def normalize_place_name(name):
+    """Key a city or country name is looked up by: accents, case and a leading "the" dropped."""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    name = " ".join(name.casefold().split())
+    if name.startswith("the "):
+        name = name[4:]
+    return name
+
+
+def normalize_country_name(name):
+    name = normalize_place_name(name)
+    return COUNTRY_ALIASES.get(name, name)
+
+
+def read_gazetteer(path=BUNDLED_GAZETTEER):
+    """Normalized (city, country, latitude, longitude) rows of a city,country,latitude,longitude CSV file."""
+    with open(path, newline="", encoding="utf-8") as gazetteer:
+        for row in csv.DictReader(gazetteer):
+            yield (
+                normalize_place_name(row["city"]),
+                normalize_country_name(row["country"]),
+                float(row["latitude"]),
+                float(row["longitude"]),
+            )
+
+
+def geocode_online(city, country):
+    try:
+        location = Nominatim(user_agent="some value").geocode(f"{city}, {country}")
+    except GeocoderServiceError:
+        return None
+    if location is None:
+        return None
+    return location.latitude, location.longitude
+
+
+def locate_city(city, country, network=True):
+    """(latitude, longitude) of a city, or None when it can't be located.
+
+    The gazetteer is looked up first. Nominatim is only asked when network is
+    true and GEOCODING_NETWORK_FALLBACK is on, its answers are kept in the gazetteer.
+    """
+    GazetteerEntry = apps.get_model("airport_system", "GazetteerEntry")
+    city_key = normalize_place_name(city)
+    country_key = normalize_country_name(country)
+
+    coordinates = GazetteerEntry.objects.filter(
+        city=city_key, country=country_key
+    ).values_list("latitude", "longitude").first()
+    if coordinates is not None or not network or not getattr(settings, "GEOCODING_NETWORK_FALLBACK", False):
+        return coordinates
+
+    coordinates = geocode_online(city, country)
+    if coordinates is not None:
+        GazetteerEntry.objects.get_or_create(
+            city=city_key,
+            country=country_key,
+            defaults={"latitude": coordinates[0], "longitude": coordinates[1]},
+        )
+    return coordinates
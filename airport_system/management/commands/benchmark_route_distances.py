@@ -0,0 +1,41 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from geopy.distance import geodesic
+
+from airport_system import distances
+
+
+class Command(BaseCommand):
+    help = "Time the batch distance engine against one geodesic() call per route, on random coordinates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--routes", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        generator = random.Random(options["seed"])
+
+        def point():
+            return generator.uniform(-70, 70), generator.uniform(-180, 180)
+
+        sources = [point() for _ in range(options["routes"])]
+        destinations = [point() for _ in range(options["routes"])]
+
+        started = time.perf_counter()
+        expected = [
+            int(geodesic(source, destination, ellipsoid=distances.ELLIPSOID).kilometers)
+            for source, destination in zip(sources, destinations)
+        ]
+        per_route = time.perf_counter() - started
+
+        started = time.perf_counter()
+        batch = distances.geodesic_distances(sources, destinations)
+        batched = time.perf_counter() - started
+
+        error = max(abs(x - y) for x, y in zip(batch, expected)) if expected else 0
+        self.stdout.write(f"{options['routes']} routes")
+        self.stdout.write(f"per-route geodesic: {per_route:.3f}s")
+        self.stdout.write(f"batch:              {batched:.3f}s, {per_route / max(batched, 1e-9):.0f}x faster")
+        self.stdout.write(f"largest difference: {error} km")
@@ -0,0 +1,93 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from airport_system.geocoding import normalize_country_name, normalize_place_name
+from airport_system.models import Airport, City, Country, Route
+from airport_system.views import RouteViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the route filters on the search_name columns against the former icontains joins, "
+        "on generated routes rolled back afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cities", type=int, default=2000)
+        parser.add_argument("--routes", type=int, default=20000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--explain", action="store_true", help="Print the query plan of every filter")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.generate(options)
+            for params in (
+                {"city_from": "benchcity 17"},
+                {"country_to": "benchland 3"},
+                {"route": "benchcity 17-benchcity 42"},
+            ):
+                self.compare(params, options)
+            transaction.set_rollback(True)
+
+    def generate(self, options):
+        generator = random.Random(options["seed"])
+        countries = Country.objects.bulk_create(
+            Country(name=f"Benchland {index}", search_name=normalize_country_name(f"Benchland {index}"))
+            for index in range(max(1, options["cities"] // 20))
+        )
+        cities = City.objects.bulk_create(
+            City(name=f"Benchcity {index}", search_name=normalize_place_name(f"Benchcity {index}"),
+                 country=generator.choice(countries))
+            for index in range(options["cities"])
+        )
+        airports = Airport.objects.bulk_create(
+            Airport(name=f"Benchcity {index} airport", closest_big_city=city)
+            for index, city in enumerate(cities)
+        )
+        Route.objects.bulk_create(
+            (
+                Route(source=generator.choice(airports), standard_destination=generator.choice(airports), distance=1)
+                for _ in range(options["routes"])
+            ),
+            batch_size=1000,
+        )
+
+    def compare(self, params, options):
+        view = RouteViewSet()
+        view.request = Request(RequestFactory().get("/", params))
+        indexed = view.get_queryset()
+        scan = Route.objects.filter(self.icontains_filter(params))
+
+        self.stdout.write(str(params))
+        for label, queryset in (("icontains joins", scan), ("search_name", indexed)):
+            started = time.perf_counter()
+            for _ in range(options["repeat"]):
+                count = len(list(queryset.all().values_list("pk", flat=True)))
+            elapsed = (time.perf_counter() - started) / options["repeat"]
+            self.stdout.write(f"  {label}: {elapsed * 1000:.2f} ms, {count} routes")
+            if options["explain"]:
+                self.stdout.write(queryset.values_list("pk", flat=True).explain())
+
+    @staticmethod
+    def icontains_filter(params):
+        # the filters as they were, with the destination side fixed so both return the same routes
+        condition = Q()
+        if "route" in params:
+            city_from, *_, city_to = params["route"].split("-")
+            params = {"city_from": city_from, "city_to": city_to}
+        for param, lookup in (
+            ("city_from", "source__closest_big_city__name__icontains"),
+            ("city_to", "standard_destination__closest_big_city__name__icontains"),
+            ("country_from", "source__closest_big_city__country__name__icontains"),
+            ("country_to", "standard_destination__closest_big_city__country__name__icontains"),
+        ):
+            if param in params:
+                condition &= Q(**{lookup: params[param]})
+        return condition
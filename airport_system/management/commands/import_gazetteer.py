@@ -0,0 +1,42 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from airport_system.geocoding import BUNDLED_GAZETTEER, read_gazetteer
+from airport_system.models import GazetteerEntry
+
+
+class Command(BaseCommand):
+    help = "Load city coordinates from a city,country,latitude,longitude CSV file into the gazetteer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default=BUNDLED_GAZETTEER,
+                            help="CSV file, the gazetteer bundled with the app by default")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = read_gazetteer(options["path"])
+        imported = 0
+
+        try:
+            with transaction.atomic():
+                while batch := list(islice(rows, options["batch_size"])):
+                    # one entry per city in a batch, a conflict can't be updated twice in one statement
+                    entries = {
+                        (city, country): GazetteerEntry(
+                            city=city, country=country, latitude=latitude, longitude=longitude
+                        )
+                        for city, country, latitude, longitude in batch
+                    }
+                    GazetteerEntry.objects.bulk_create(
+                        entries.values(),
+                        update_conflicts=True,
+                        unique_fields=["city", "country"],
+                        update_fields=["latitude", "longitude"],
+                    )
+                    imported += len(batch)
+        except (OSError, KeyError, ValueError) as exc:
+            raise CommandError(f"Can't import {options['path']}: {exc!r}")
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} gazetteer entries"))
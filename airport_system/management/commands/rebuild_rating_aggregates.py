@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from airport_system.models import AirlineRatingAggregate, AirlineRatingDailyBucket
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-airline rating aggregates and daily buckets from the AirlineRating rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--airline", type=int, action="append", dest="airline_ids",
+                            help="Only rebuild this airline id, may be repeated")
+
+    def handle(self, *args, **options):
+        rebuilt = AirlineRatingAggregate.rebuild(airline_ids=options["airline_ids"])
+        buckets = AirlineRatingDailyBucket.rebuild(airline_ids=options["airline_ids"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rating aggregates of {rebuilt} airlines and {buckets} daily buckets"
+        ))
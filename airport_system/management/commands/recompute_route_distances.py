@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from airport_system.distances import UPDATE_BATCH_SIZE, recompute_route_distances
+from airport_system.models import City, Route
+
+
+class Command(BaseCommand):
+    help = "Locate cities missing coordinates, then recompute Route.distance from the stored coordinates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=UPDATE_BATCH_SIZE)
+        parser.add_argument("--unresolved-only", action="store_true",
+                            help="Only routes without a distance or with -1")
+
+    def handle(self, *args, **options):
+        located = 0
+        for city in City.objects.select_related("country").filter(Q(latitude=None) | Q(longitude=None)):
+            if city.locate() is not None:
+                city.save(update_fields=["latitude", "longitude"])
+                located += 1
+
+        routes = Route.objects.all()
+        if options["unresolved_only"]:
+            routes = routes.filter(Q(distance=None) | Q(distance=-1))
+
+        updated, unresolved = recompute_route_distances(routes, batch_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Located {located} cities, updated {updated} route distances, {unresolved} still unresolved"
+        ))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from airport_system.models import Flight, Ticket
+
+
+class Command(BaseCommand):
+    help = "Recount Flight.seats_total and Flight.seats_sold from the airplane layouts and tickets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = 0
+        fixed = 0
+
+        while True:
+            flights = list(
+                Flight.objects.select_related("airplane")
+                .filter(pk__gt=last_id)
+                .order_by("pk")[:batch_size]
+            )
+            if not flights:
+                break
+            last_id = flights[-1].pk
+
+            with transaction.atomic():
+                sold_per_flight = dict(
+                    Ticket.objects.filter(flight__in=flights, released=False)
+                    .values_list("flight_id")
+                    .annotate(sold=Count("id"))
+                    .order_by()
+                )
+                changed = []
+                for flight in flights:
+                    seats_total = flight.airplane.total_seats
+                    seats_sold = sold_per_flight.get(flight.pk, 0)
+                    if (flight.seats_total, flight.seats_sold) != (seats_total, seats_sold):
+                        flight.seats_total = seats_total
+                        flight.seats_sold = seats_sold
+                        changed.append(flight)
+
+                Flight.objects.bulk_update(changed, ["seats_total", "seats_sold"])
+            fixed += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled seat counters of {fixed} flights"))
@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from airport_system.distance_jobs import DistanceWorkerPool
+
+
+class Command(BaseCommand):
+    help = "Run the workers resolving the distances of pending routes from the DistanceJob queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Routes resolved at the same time")
+        parser.add_argument("--max-attempts", type=int, default=5)
+        parser.add_argument("--retry-delay", type=int, default=60,
+                            help="Seconds before the first retry, doubled on every attempt")
+        parser.add_argument("--poll-interval", type=float, default=5,
+                            help="Seconds to wait when no job is due")
+        parser.add_argument("--once", action="store_true", help="Exit once no job is due")
+
+    def handle(self, *args, **options):
+        pool = DistanceWorkerPool(
+            workers=max(options["workers"], 1),
+            max_attempts=options["max_attempts"],
+            retry_delay=timedelta(seconds=options["retry_delay"]),
+        )
+        resolved_total = processed_total = 0
+
+        try:
+            while True:
+                resolved, processed = pool.run_once()
+                resolved_total += resolved
+                processed_total += processed
+                if not processed:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resolved {resolved_total} of {processed_total} route distance jobs"
+        ))
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:21
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_seat_layout(apps, schema_editor):
+    Airplane = apps.get_model("airport_system", "Airplane")
+    Seat = apps.get_model("airport_system", "Seat")
+
+    for airplane in Airplane.objects.all():
+        seat_counts = dict(
+            Seat.objects.filter(airplane_id=airplane.pk)
+            .values_list("row")
+            .annotate(seat_count=Count("id"))
+            .order_by()
+        )
+        airplane.seat_layout = [
+            seat_counts.get(row, 0) for row in range(1, max(seat_counts, default=0) + 1)
+        ]
+        airplane.save(update_fields=["seat_layout"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0020_airlinerating_created_time"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="airplane",
+            name="seat_layout",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(fill_seat_layout, migrations.RunPython.noop),
+    ]
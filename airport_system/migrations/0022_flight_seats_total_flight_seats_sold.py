@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_seat_counters(apps, schema_editor):
+    Flight = apps.get_model("airport_system", "Flight")
+    Ticket = apps.get_model("airport_system", "Ticket")
+
+    sold_per_flight = dict(
+        Ticket.objects.values_list("flight_id").annotate(sold=Count("id")).order_by()
+    )
+    for flight in Flight.objects.select_related("airplane"):
+        flight.seats_total = sum(flight.airplane.seat_layout)
+        flight.seats_sold = sold_per_flight.get(flight.pk, 0)
+        flight.save(update_fields=["seats_total", "seats_sold"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0021_airplane_seat_layout"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flight",
+            name="seats_sold",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="flight",
+            name="seats_total",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_seat_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+CATEGORIES = ("boarding_deplaining", "crew", "services", "entertainment", "wi_fi")
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    AirlineRating = apps.get_model("airport_system", "AirlineRating")
+    AirlineRatingAggregate = apps.get_model("airport_system", "AirlineRatingAggregate")
+
+    columns = {"ratings_count": Count("id")}
+    for category in CATEGORIES:
+        columns[f"{category}_sum"] = Sum(f"{category}_rating", default=0)
+        columns[f"{category}_count"] = Count(f"{category}_rating")
+
+    rows = AirlineRating.objects.values("airline_id").annotate(**columns).order_by()
+    AirlineRatingAggregate.objects.bulk_create(
+        [AirlineRatingAggregate(**row) for row in rows]
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0023_seathold"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AirlineRatingAggregate",
+            fields=[
+                (
+                    "airline",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rating_aggregate",
+                        serialize=False,
+                        to="airport_system.airline",
+                    ),
+                ),
+                ("ratings_count", models.PositiveIntegerField(default=0)),
+                ("boarding_deplaining_sum", models.PositiveIntegerField(default=0)),
+                ("boarding_deplaining_count", models.PositiveIntegerField(default=0)),
+                ("crew_sum", models.PositiveIntegerField(default=0)),
+                ("crew_count", models.PositiveIntegerField(default=0)),
+                ("services_sum", models.PositiveIntegerField(default=0)),
+                ("services_count", models.PositiveIntegerField(default=0)),
+                ("entertainment_sum", models.PositiveIntegerField(default=0)),
+                ("entertainment_count", models.PositiveIntegerField(default=0)),
+                ("wi_fi_sum", models.PositiveIntegerField(default=0)),
+                ("wi_fi_count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
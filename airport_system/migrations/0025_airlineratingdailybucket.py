@@ -0,0 +1,81 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+CATEGORIES = ("boarding_deplaining", "crew", "services", "entertainment", "wi_fi")
+
+
+def fill_rating_buckets(apps, schema_editor):
+    AirlineRating = apps.get_model("airport_system", "AirlineRating")
+    AirlineRatingDailyBucket = apps.get_model("airport_system", "AirlineRatingDailyBucket")
+
+    columns = {"ratings_count": Count("id")}
+    for category in CATEGORIES:
+        columns[f"{category}_sum"] = Sum(f"{category}_rating", default=0)
+        columns[f"{category}_count"] = Count(f"{category}_rating")
+
+    rows = (
+        AirlineRating.objects.annotate(day=TruncDate("created_time"))
+        .values("airline_id", "day")
+        .annotate(**columns)
+        .order_by()
+    )
+    AirlineRatingDailyBucket.objects.bulk_create(
+        [AirlineRatingDailyBucket(**row) for row in rows]
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0024_airlineratingaggregate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AirlineRatingDailyBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("ratings_count", models.PositiveIntegerField(default=0)),
+                ("boarding_deplaining_sum", models.PositiveIntegerField(default=0)),
+                ("boarding_deplaining_count", models.PositiveIntegerField(default=0)),
+                ("crew_sum", models.PositiveIntegerField(default=0)),
+                ("crew_count", models.PositiveIntegerField(default=0)),
+                ("services_sum", models.PositiveIntegerField(default=0)),
+                ("services_count", models.PositiveIntegerField(default=0)),
+                ("entertainment_sum", models.PositiveIntegerField(default=0)),
+                ("entertainment_count", models.PositiveIntegerField(default=0)),
+                ("wi_fi_sum", models.PositiveIntegerField(default=0)),
+                ("wi_fi_count", models.PositiveIntegerField(default=0)),
+                ("day", models.DateField()),
+                (
+                    "airline",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rating_buckets",
+                        to="airport_system.airline",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("airline", "day"),
+                        name="unique_rating_bucket_airline_day",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_rating_buckets, migrations.RunPython.noop),
+    ]
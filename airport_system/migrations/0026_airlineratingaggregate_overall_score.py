@@ -0,0 +1,44 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:30
+
+from django.db import migrations, models
+
+
+WEIGHTS = {
+    "boarding_deplaining": 0.05,
+    "crew": 0.2,
+    "services": 0.15,
+    "entertainment": 0.1,
+    "wi_fi": 0.05,
+}
+
+
+def fill_overall_score(apps, schema_editor):
+    AirlineRatingAggregate = apps.get_model("airport_system", "AirlineRatingAggregate")
+
+    aggregates = list(AirlineRatingAggregate.objects.all())
+    for aggregate in aggregates:
+        total_score = 0
+        total_weight = 0
+        for category, weight in WEIGHTS.items():
+            count = getattr(aggregate, f"{category}_count")
+            if count:
+                total_score += getattr(aggregate, f"{category}_sum") / count * weight
+                total_weight += weight
+        aggregate.overall_score = total_score / total_weight if total_weight else 0
+
+    AirlineRatingAggregate.objects.bulk_update(aggregates, ["overall_score"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0025_airlineratingdailybucket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="airlineratingaggregate",
+            name="overall_score",
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.RunPython(fill_overall_score, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:05
+
+import csv
+import os
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Frozen copies of the airport_system.geocoding helpers as they were when this
+# migration was written, so later changes to them don't change what it does
+COUNTRY_ALIASES = {
+    "usa": "united states",
+    "us": "united states",
+    "united states of america": "united states",
+    "uk": "united kingdom",
+    "great britain": "united kingdom",
+    "uae": "united arab emirates",
+}
+
+
+def normalize_place_name(name):
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    name = " ".join(name.casefold().split())
+    if name.startswith("the "):
+        name = name[4:]
+    return name
+
+
+def normalize_country_name(name):
+    name = normalize_place_name(name)
+    return COUNTRY_ALIASES.get(name, name)
+
+
+BUNDLED_GAZETTEER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "gazetteer.csv")
+
+
+def read_gazetteer(path=BUNDLED_GAZETTEER):
+    with open(path, newline="", encoding="utf-8") as gazetteer:
+        for row in csv.DictReader(gazetteer):
+            yield (
+                normalize_place_name(row["city"]),
+                normalize_country_name(row["country"]),
+                float(row["latitude"]),
+                float(row["longitude"]),
+            )
+
+
+def load_bundled_gazetteer(apps, schema_editor):
+    GazetteerEntry = apps.get_model("airport_system", "GazetteerEntry")
+
+    GazetteerEntry.objects.bulk_create(
+        [
+            GazetteerEntry(city=city, country=country, latitude=latitude, longitude=longitude)
+            for city, country, latitude, longitude in read_gazetteer()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0026_airlineratingaggregate_overall_score"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GazetteerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("city", models.CharField(max_length=64)),
+                ("country", models.CharField(max_length=64)),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+            ],
+            options={
+                "verbose_name_plural": "gazetteer entries",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("city", "country"),
+                        name="unique_gazetteer_city_country",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(load_bundled_gazetteer, migrations.RunPython.noop),
+    ]
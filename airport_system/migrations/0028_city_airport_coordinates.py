@@ -0,0 +1,83 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:40
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Frozen copies of the airport_system.geocoding helpers as they were when this
+# migration was written, so later changes to them don't change what it does
+COUNTRY_ALIASES = {
+    "usa": "united states",
+    "us": "united states",
+    "united states of america": "united states",
+    "uk": "united kingdom",
+    "great britain": "united kingdom",
+    "uae": "united arab emirates",
+}
+
+
+def normalize_place_name(name):
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    name = " ".join(name.casefold().split())
+    if name.startswith("the "):
+        name = name[4:]
+    return name
+
+
+def normalize_country_name(name):
+    name = normalize_place_name(name)
+    return COUNTRY_ALIASES.get(name, name)
+
+
+def fill_city_coordinates(apps, schema_editor):
+    City = apps.get_model("airport_system", "City")
+    GazetteerEntry = apps.get_model("airport_system", "GazetteerEntry")
+
+    gazetteer = {
+        (city, country): (latitude, longitude)
+        for city, country, latitude, longitude in GazetteerEntry.objects.values_list(
+            "city", "country", "latitude", "longitude"
+        )
+    }
+    cities = []
+    for city in City.objects.select_related("country"):
+        coordinates = gazetteer.get(
+            (normalize_place_name(city.name), normalize_country_name(city.country.name))
+        )
+        if coordinates is not None:
+            city.latitude, city.longitude = coordinates
+            cities.append(city)
+
+    City.objects.bulk_update(cities, ["latitude", "longitude"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0027_gazetteerentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="airport",
+            name="latitude",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="airport",
+            name="longitude",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="city",
+            name="latitude",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="city",
+            name="longitude",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_city_coordinates, migrations.RunPython.noop),
+    ]
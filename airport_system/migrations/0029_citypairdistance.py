@@ -0,0 +1,51 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0028_city_airport_coordinates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CityPairDistance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("distance", models.IntegerField()),
+                (
+                    "city_a",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="airport_system.city",
+                    ),
+                ),
+                (
+                    "city_b",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="airport_system.city",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("city_a", "city_b"), name="unique_city_pair_distance"
+                    )
+                ],
+            },
+        ),
+    ]
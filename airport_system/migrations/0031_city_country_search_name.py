@@ -0,0 +1,93 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:05
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Frozen copies of the airport_system.geocoding helpers as they were when this
+# migration was written, so later changes to them don't change what it does
+COUNTRY_ALIASES = {
+    "usa": "united states",
+    "us": "united states",
+    "united states of america": "united states",
+    "uk": "united kingdom",
+    "great britain": "united kingdom",
+    "uae": "united arab emirates",
+}
+
+
+def normalize_place_name(name):
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    name = " ".join(name.casefold().split())
+    if name.startswith("the "):
+        name = name[4:]
+    return name
+
+
+def normalize_country_name(name):
+    name = normalize_place_name(name)
+    return COUNTRY_ALIASES.get(name, name)
+
+
+def fill_search_names(apps, schema_editor):
+    City = apps.get_model("airport_system", "City")
+    Country = apps.get_model("airport_system", "Country")
+
+    countries = list(Country.objects.all())
+    for country in countries:
+        country.search_name = normalize_country_name(country.name)
+    Country.objects.bulk_update(countries, ["search_name"], batch_size=1000)
+
+    cities = list(City.objects.all())
+    for city in cities:
+        city.search_name = normalize_place_name(city.name)
+    City.objects.bulk_update(cities, ["search_name"], batch_size=1000)
+
+
+TRIGRAM_INDEXED_TABLES = ("airport_system_city", "airport_system_country")
+
+
+def add_trigram_indexes(apps, schema_editor):
+    # Only where the pg_trgm extension is already installed, for ROUTE_SEARCH_TRIGRAM
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    for table in TRIGRAM_INDEXED_TABLES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_search_name_trgm ON {table} USING gin (search_name gin_trgm_ops)"
+        )
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in TRIGRAM_INDEXED_TABLES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_name_trgm")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0030_distancejob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="city",
+            name="search_name",
+            field=models.CharField(db_index=True, default="", editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="country",
+            name="search_name",
+            field=models.CharField(db_index=True, default="", editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_search_names, migrations.RunPython.noop),
+        migrations.RunPython(add_trigram_indexes, remove_trigram_indexes),
+    ]
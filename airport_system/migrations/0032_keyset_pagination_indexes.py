@@ -0,0 +1,26 @@
+# Generated by Django 5.0.1 on 2026-10-18 22:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0031_city_country_search_name"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(fields=["departure_time", "id"], name="flight_departure_keyset_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["user", "created_at", "id"], name="order_user_keyset_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="airlinerating",
+            index=models.Index(fields=["created_time", "id"], name="rating_created_keyset_idx"),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0032_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ticket",
+            name="released",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RemoveConstraint(
+            model_name="ticket",
+            name="unique_row_seat_flight",
+        ),
+        migrations.AddConstraint(
+            model_name="ticket",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("released", False)),
+                fields=("row", "seat", "flight"),
+                name="unique_row_seat_flight",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-19 09:40
+
+from django.db import migrations
+
+
+def seat_masks(apps, schema_editor):
+    Airplane = apps.get_model("airport_system", "Airplane")
+    Seat = apps.get_model("airport_system", "Seat")
+
+    for airplane in Airplane.objects.all():
+        masks = {}
+        for row, seat_number in Seat.objects.filter(airplane_id=airplane.pk).values_list("row", "seat_number"):
+            if row > 0 and seat_number > 0:
+                masks[row] = masks.get(row, 0) | 1 << (seat_number - 1)
+        airplane.seat_layout = [masks.get(row, 0) for row in range(1, max(masks, default=0) + 1)]
+        airplane.save(update_fields=["seat_layout"])
+
+
+def seat_counts(apps, schema_editor):
+    Airplane = apps.get_model("airport_system", "Airplane")
+
+    for airplane in Airplane.objects.all():
+        airplane.seat_layout = [bin(mask).count("1") for mask in airplane.seat_layout]
+        airplane.save(update_fields=["seat_layout"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport_system", "0033_ticket_released"),
+    ]
+
+    operations = [
+        migrations.RunPython(seat_masks, seat_counts),
+    ]
@@ -1,20 +1,45 @@
+import math
 import os
 import uuid
+from datetime import timedelta
 
 import pytz
 from django.conf import settings
-from django.db import models
-from django.db.models import Count, Max, Avg
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models, transaction
+from django.db.models import Count, Max, F, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.text import slugify
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 from rest_framework.exceptions import ValidationError
 
 from geopy.distance import geodesic
-from geopy.geocoders import Nominatim
+
+from airport_system import distance_jobs
+from airport_system.airport_index import get_airport_index, invalidate_airport_index, midpoint
+from airport_system.distance_cache import get_distance_cache
+from airport_system.distances import ELLIPSOID
+from airport_system.geocoding import locate_city, normalize_country_name, normalize_place_name
+from airport_system.name_search import invalidate_autocomplete_index
+from airport_system.seat_holds import get_seat_hold_backend
+from airport_system.seat_map import SeatMap
 
 
 class Country(models.Model):
     name = models.CharField(max_length=64, unique=True)
+    # normalized name the route filters match on, see airport_system.name_search
+    search_name = models.CharField(max_length=64, db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_country_name(self.name)
+        super().save(*args, **kwargs)
+        invalidate_autocomplete_index()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_autocomplete_index()
+        return result
 
     def __str__(self) -> str:
         return self.name
@@ -27,6 +52,44 @@ class Country(models.Model):
 class City(models.Model):
     name = models.CharField(max_length=64)
     country = models.ForeignKey(Country, on_delete=models.CASCADE)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    search_name = models.CharField(max_length=64, db_index=True, editable=False)
+
+    @property
+    def coordinates(self):
+        if self.latitude is None or self.longitude is None:
+            return None
+        return self.latitude, self.longitude
+
+    def locate(self, network=True):
+        # Fill the coordinates once, from the gazetteer or the network fallback
+        if self.coordinates is None:
+            self.latitude, self.longitude = locate_city(self.name, self.country.name, network) or (None, None)
+        return self.coordinates
+
+    def save(self, *args, **kwargs):
+        # With background distances the network lookup is left to the resolve_route_distances workers
+        self.locate(network=not distance_jobs.is_enabled())
+        self.search_name = normalize_place_name(self.name)
+
+        moved = False
+        if not self._state.adding:
+            previous = City.objects.filter(pk=self.pk).values_list("latitude", "longitude").first()
+            moved = previous is not None and previous != (self.latitude, self.longitude)
+
+        super().save(*args, **kwargs)
+        invalidate_autocomplete_index()
+        if moved:
+            # Routes keep their distance, recompute_route_distances refreshes them
+            get_distance_cache().invalidate_city(self.pk)
+            invalidate_airport_index()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_airport_index()
+        invalidate_autocomplete_index()
+        return result
 
     def __str__(self) -> str:
         return self.name
@@ -42,11 +105,72 @@ class Airport(models.Model):
     iata_code = models.CharField(max_length=3, blank=True, null=True, unique=True)
     TIMEZONE_CHOICES = [(tz, tz) for tz in pytz.all_timezones]
     timezone = models.CharField(max_length=63, default='UTC', choices=TIMEZONE_CHOICES)
+    # Own position of the airport, the closest big city stands in when not set
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+
+    @property
+    def has_own_coordinates(self):
+        return self.latitude is not None and self.longitude is not None
+
+    @property
+    def coordinates(self):
+        if self.has_own_coordinates:
+            return self.latitude, self.longitude
+        return self.closest_big_city.coordinates
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_airport_index()
+        invalidate_autocomplete_index()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_airport_index()
+        invalidate_autocomplete_index()
+        return result
 
     def __str__(self) -> str:
         return f"{self.name} ({self.closest_big_city}) - {self.iata_code}"
 
 
+class GazetteerEntry(models.Model):
+    """Coordinates of a city, looked up before any network geocoding.
+
+    City and country are stored normalized, see geocoding.normalize_place_name().
+    """
+
+    city = models.CharField(max_length=64)
+    country = models.CharField(max_length=64)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        verbose_name_plural = "gazetteer entries"
+        constraints = [
+            models.UniqueConstraint(fields=['city', 'country'], name='unique_gazetteer_city_country')
+        ]
+
+    def __str__(self):
+        return f"{self.city}, {self.country} ({self.latitude}, {self.longitude})"
+
+
+class CityPairDistance(models.Model):
+    """Distance between two cities, city_a being the one with the lower id."""
+
+    city_a = models.ForeignKey(City, on_delete=models.CASCADE, related_name="+")
+    city_b = models.ForeignKey(City, on_delete=models.CASCADE, related_name="+")
+    distance = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['city_a', 'city_b'], name='unique_city_pair_distance')
+        ]
+
+    def __str__(self):
+        return f"{self.city_a} - {self.city_b}: {self.distance} km"
+
+
 class Airline(models.Model):
     name = models.CharField(max_length=255, verbose_name='Name')
     headquarter = models.CharField(blank=True, null=True, max_length=255, verbose_name='Headquarter')
@@ -54,26 +178,31 @@ class Airline(models.Model):
     iata_icao = models.CharField(blank=True, null=True, max_length=20, verbose_name='IATA/ICAO Codes')
     url_logo = models.URLField(blank=True, null=True, verbose_name='URL Logo')
 
-    @property
+    RATING_WEIGHTS = {
+        'avg_boarding_deplaining': 0.05,
+        'avg_crew': 0.2,
+        'avg_services': 0.15,
+        'avg_entertainment': 0.1,
+        'avg_wi_fi': 0.05
+    }
+
+    @cached_property
     def overall_rating(self):
+        # Cached per instance, the serializer reads it once per rating field
+        try:
+            rating_per_category = self.rating_aggregate.averages()
+        except AirlineRatingAggregate.DoesNotExist:
+            rating_per_category = {}
 
-        WEIGHTS = {
-            'avg_boarding_deplaining': 0.05,
-            'avg_crew': 0.2,
-            'avg_services': 0.15,
-            'avg_entertainment': 0.1,
-            'avg_wi_fi': 0.05
-        }
+        return self.weigh_ratings(rating_per_category)
 
-        rating_per_category = self.ratings.filter(airline=self) \
-            .aggregate(
-            avg_boarding_deplaining=Avg('boarding_deplaining_rating'),
-            avg_crew=Avg('crew_rating'),
-            avg_services=Avg('services_rating'),
-            avg_entertainment=Avg('entertainment_rating'),
-            avg_wi_fi=Avg('wi_fi_rating')
+    def recent_rating(self, window_days=None, half_life_days=None):
+        return self.weigh_ratings(
+            AirlineRatingDailyBucket.recent_averages(self.pk, window_days, half_life_days)
         )
 
+    @classmethod
+    def weigh_ratings(cls, rating_per_category):
         total_score = 0
         total_weight = 0
 
@@ -83,7 +212,7 @@ class Airline(models.Model):
             value = rating
             if value is None:
                 continue
-            weight = WEIGHTS.get(category, 0)
+            weight = cls.RATING_WEIGHTS.get(category, 0)
 
             total_score += value * weight
             total_weight += weight
@@ -117,34 +246,87 @@ class Route(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='on schedule')
 
     def calculate_distance(self):
-        try:
-            geolocator = Nominatim(user_agent="some value")
+        # Stored coordinates only, cities are located when they are saved
+        if not self.source.has_own_coordinates and not self.standard_destination.has_own_coordinates:
+            return get_distance_cache().distance(
+                self.source.closest_big_city, self.standard_destination.closest_big_city
+            )
 
-            location1 = geolocator.geocode(
-                f"{self.source.closest_big_city.name}, {self.source.closest_big_city.country.name}")
-            latitude1 = location1.latitude
-            longitude1 = location1.longitude
+        source = self.source.coordinates
+        destination = self.standard_destination.coordinates
+        if source is None or destination is None:
+            return -1
 
-            location2 = geolocator.geocode(
-                f"{self.standard_destination.closest_big_city.name}, {self.standard_destination.closest_big_city.country.name}")
-            latitude2 = location2.latitude
-            longitude2 = location2.longitude
+        distance = geodesic(source, destination, ellipsoid=ELLIPSOID).kilometers
 
-            distance = geodesic((latitude1, longitude1), (latitude2, longitude2), ellipsoid='GRS-67').kilometers
+        return int(distance)
 
-            return int(distance)
-        except (GeocoderTimedOut, GeocoderUnavailable):
-            return -1
+    def alternate_airports(self, k=3):
+        """Up to k (airport, km) nearest to the middle of the route, its own airports left out."""
+        source = self.source.coordinates
+        destination = self.standard_destination.coordinates
+        if source is None or destination is None:
+            return []
+
+        nearest = get_airport_index().nearest(
+            *midpoint(source, destination), k=k, exclude={self.source_id, self.standard_destination_id}
+        )
+        airports = Airport.objects.select_related("closest_big_city").in_bulk(
+            [airport_id for airport_id, _ in nearest]
+        )
+        return [(airports[airport_id], distance) for airport_id, distance in nearest if airport_id in airports]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_endpoints = (loaded.get("source_id"), loaded.get("standard_destination_id"))
+        return instance
+
+    def endpoints_changed(self):
+        return getattr(self, "_loaded_endpoints", None) != (self.source_id, self.standard_destination_id)
 
     def save(self, *args, **kwargs):
-        if not self.distance:
+        # Only a new route, or one moved to other airports, gets its distance calculated,
+        # re-saving a route whose distance is pending leaves it to its job
+        pending = False
+        if self._state.adding and not self.distance or not self._state.adding and self.endpoints_changed():
             self.distance = self.calculate_distance()
-        super().save(*args, **kwargs)
+            # a city isn't located yet, leave the distance pending for the background workers
+            pending = self.distance == -1 and distance_jobs.is_enabled()
+            if pending:
+                self.distance = None
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if pending:
+                distance_jobs.enqueue(self)
+        self._loaded_endpoints = (self.source_id, self.standard_destination_id)
 
     def __str__(self) -> str:
         return f"{self.source.closest_big_city} - {self.standard_destination.closest_big_city}"
 
 
+class DistanceJob(models.Model):
+    """A route waiting for its distance, taken by the resolve_route_distances workers."""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    ]
+
+    route = models.OneToOneField(Route, on_delete=models.CASCADE, related_name="distance_job")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Distance of {self.route} ({self.status}, {self.attempts} attempts)"
+
+
 class AirplaneType(models.Model):
     name = models.CharField(max_length=255)
 
@@ -165,28 +347,70 @@ class Airplane(models.Model):
     airline = models.ForeignKey(Airline, related_name="airplanes", on_delete=models.CASCADE)
     image = models.ImageField(null=True, upload_to=airplane_image_file_path)
 
+    # Seats of each row as a bitmask, bit n - 1 standing for seat number n,
+    # index 0 being row 1; kept in sync with the Seat rows
+    seat_layout = models.JSONField(default=list, blank=True)
+
+    @staticmethod
+    def _seat_count(mask):
+        return bin(mask).count("1")
+
     @property
     def total_rows(self):
-        # Calculate the total number of distinct rows based on associated seats
-        return self.seats.values('row').distinct().count()
+        return sum(1 for mask in self.seat_layout if mask)
 
     @property
     def total_seats(self):
-        return self.seats.count()
+        return sum(self._seat_count(mask) for mask in self.seat_layout)
 
     def custom_rows_with_seat_count(self):
-        return Seat.objects.filter(airplane_id=self.pk).values(
-            "row"
-        ).annotate(
-            seat_count=Count('id')
-        )
+        return [
+            {"row": row, "seat_count": self._seat_count(mask)}
+            for row, mask in enumerate(self.seat_layout, start=1)
+            if mask
+        ]
 
     def standard_number_seats_in_row(self):
-        seat_counts = [row_data['seat_count'] for row_data in self.custom_rows_with_seat_count()]
+        seat_counts = [self._seat_count(mask) for mask in self.seat_layout if mask]
         if len(set(seat_counts)) == 1:
             return seat_counts[0]
         return None
 
+    def has_row(self, row):
+        return row is not None and 0 < row <= len(self.seat_layout) and self.seat_layout[row - 1] > 0
+
+    def has_seat(self, row, seat_number):
+        return (
+            self.has_row(row) and seat_number is not None and seat_number > 0
+            and bool(self.seat_layout[row - 1] >> (seat_number - 1) & 1)
+        )
+
+    @staticmethod
+    def layout_from_distribution(row_seats_distribution):
+        # seats numbered from 1 in every row, as build_seats() creates them
+        return [(1 << seats) - 1 for seats in row_seats_distribution]
+
+    @staticmethod
+    def layout_from_seats(seats):
+        masks = {}
+        for row, seat_number in seats.values_list("row", "seat_number"):
+            if row > 0 and seat_number > 0:
+                masks[row] = masks.get(row, 0) | 1 << (seat_number - 1)
+        return [masks.get(row, 0) for row in range(1, max(masks, default=0) + 1)]
+
+    def refresh_seat_layout(self):
+        self.seat_layout = self.layout_from_seats(Seat.objects.filter(airplane_id=self.pk))
+        Airplane.objects.filter(pk=self.pk).update(seat_layout=self.seat_layout)
+        Flight.objects.filter(airplane_id=self.pk).update(seats_total=self.total_seats)
+
+    def build_seats(self, row_seats_distribution):
+        # Unsaved seats, rows numbered from 1 in the order of the distribution
+        return [
+            Seat(airplane=self, row=row, seat_number=seat_number)
+            for row, seats in enumerate(row_seats_distribution, start=1)
+            for seat_number in range(1, seats + 1)
+        ]
+
     def __str__(self) -> str:
         return self.name
 
@@ -210,6 +434,17 @@ class Seat(models.Model):
     seat_number = models.IntegerField()
     airplane = models.ForeignKey(Airplane, related_name="seats", on_delete=models.CASCADE)
 
+    # bulk_create() and queryset update()/delete() bypass these hooks,
+    # callers using them must maintain Airplane.seat_layout themselves
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.airplane.refresh_seat_layout()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.airplane.refresh_seat_layout()
+        return result
+
     def __str__(self):
         return f"Row {self.row}, Seat {self.seat_number}"
 
@@ -238,30 +473,88 @@ class Flight(models.Model):
     estimated_arrival_time = models.DateTimeField()
     real_arrival_time = models.DateTimeField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in flight')
+    # Denormalized inventory, seats_sold is only ever changed through add_sold_seats(),
+    # the Ticket signals in airport_system.signals keep it for every save and delete
+    seats_total = models.PositiveIntegerField(default=0)
+    seats_sold = models.PositiveIntegerField(default=0)
 
     @property
     def tickets_available(self):
-        # Получение связанных билетов для данного полета
-        tickets = Ticket.objects.filter(flight=self)
-
-        # Получение связанных самолетов для полета
-        airplanes = Airplane.objects.filter(flight=self)
+        return max(0, self.seats_total - self.seats_sold)
 
-        # Получение количества сидений в каждом ряду
-        rows_with_seat_count = airplanes.values('seats__row').annotate(seat_count=Count('id'))
+    @staticmethod
+    def add_sold_seats(flight_id, count):
+        # Atomic in the database, negative count releases seats
+        Flight.objects.filter(pk=flight_id).update(
+            seats_sold=Greatest(F("seats_sold") + count, 0)
+        )
 
-        # Агрегированная функция count для билетов полета
-        sold_tickets = tickets.count()
+    def save(self, *args, **kwargs):
+        self.seats_total = self.airplane.total_seats
+
+        if not self._state.adding and not kwargs.get("update_fields") and not kwargs.get("force_insert"):
+            # never write seats_sold back from a possibly stale instance
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "seats_sold"
+            ]
+        super().save(*args, **kwargs)
 
-        # Расчет доступных билетов
-        total_seats = sum(row['seat_count'] for row in rows_with_seat_count)
-        available_tickets = max(0, total_seats - sold_tickets)
+    def seat_map(self, user_id=None):
+        # The layout comes with the airplane, only taken and held seats are queried.
+        # Seats held by user_id stay free for that user.
+        taken = Ticket.objects.filter(
+            flight=self, released=False, row__isnull=False, seat__isnull=False
+        ).values_list("row", "seat")
+        held = [
+            seat for seat, holder_id in get_seat_hold_backend().active_holds(self.pk).items()
+            if holder_id != user_id
+        ]
+        return SeatMap.from_layout(self.airplane.seat_layout, taken, held)
+
+    def allocate_pending_seats(self):
+        # Check-in for the whole flight: one pass over the seat map and one bulk update,
+        # tickets of the same order are seated together where possible.
+        # Returns the number of tickets that got a seat and the number left without one.
+        with transaction.atomic():
+            Flight.objects.select_for_update().filter(pk=self.pk).first()
+            pending = list(
+                self.tickets.select_for_update()
+                .filter(type='check-in-pending', released=False)
+                .order_by("order_id", "id")
+            )
+            seat_map = self.seat_map()
+            unseated_per_order = {}
+            for ticket in pending:
+                if ticket.row is None or ticket.seat is None:
+                    unseated_per_order.setdefault(ticket.order_id, []).append(ticket)
+                else:
+                    ticket.type = 'completed'
+
+            allocated = 0
+            unallocated = 0
+            for tickets in unseated_per_order.values():
+                seats = seat_map.allocate_group(len(tickets))
+                for ticket, (row, seat) in zip(tickets, seats):
+                    ticket.row, ticket.seat, ticket.type = row, seat, 'completed'
+                allocated += len(seats)
+                unallocated += len(tickets) - len(seats)
+
+            Ticket.objects.bulk_update(
+                [ticket for ticket in pending if ticket.type == 'completed'],
+                ["row", "seat", "type"],
+                batch_size=500,
+            )
 
-        return available_tickets
+        return allocated, unallocated
 
     def __str__(self):
         return f"{self.route}; {self.departure_time} - {self.estimated_arrival_time}"
 
+    class Meta:
+        # the keyset FlightPagination seeks on
+        indexes = [models.Index(fields=["departure_time", "id"], name="flight_departure_keyset_idx")]
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -275,8 +568,51 @@ class Order(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
 
+    RELEASED_STATUSES = ('canceled', 'refunded')
+
     class Meta:
         ordering = ["-created_at"]
+        # the keyset OrderPagination seeks on, within the orders of a user
+        indexes = [models.Index(fields=["user", "created_at", "id"], name="order_user_keyset_idx")]
+
+    def get_status_change_error(self, previous_status):
+        # Released seats may have been sold again, an order can't take them back
+        if previous_status in self.RELEASED_STATUSES and self.status not in self.RELEASED_STATUSES:
+            return {"status": f"A {previous_status} order can't become {self.status}, its seats were released."}
+        return None
+
+    def clean(self):
+        if not self._state.adding:
+            previous_status = Order.objects.filter(pk=self.pk).values_list("status", flat=True).first()
+            error = self.get_status_change_error(previous_status)
+            if error:
+                raise DjangoValidationError(error)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous_status = None
+            if not self._state.adding:
+                # locked, so of two concurrent cancellations only the first one releases
+                previous_status = (
+                    Order.objects.select_for_update().filter(pk=self.pk).values_list("status", flat=True).first()
+                )
+            error = self.get_status_change_error(previous_status)
+            if error:
+                raise ValidationError(error)
+            super().save(*args, **kwargs)
+
+            if self.status in self.RELEASED_STATUSES and previous_status not in self.RELEASED_STATUSES:
+                self.release_tickets()
+
+    def release_tickets(self):
+        # Canceled and refunded orders give their seats back to the flights,
+        # the tickets are kept as booking history
+        tickets = self.tickets.filter(released=False)
+        sold_per_flight = list(tickets.values_list("flight_id").annotate(sold=Count("id")).order_by())
+
+        tickets.update(released=True)
+        for flight_id, sold in sold_per_flight:
+            Flight.add_sold_seats(flight_id, -sold)
 
     def __str__(self):
         return f"{self.created_at} - {self.get_status_display()}"
@@ -294,48 +630,92 @@ class Ticket(models.Model):
     flight = models.ForeignKey(Flight, related_name="tickets", on_delete=models.CASCADE)
     allocated = models.BooleanField(default=True)
     type = models.CharField(max_length=20, choices=TYPE_CHOICES, default='check-in-pending')
+    # Set when the order is canceled or refunded, the seat can then be sold again
+    released = models.BooleanField(default=False)
 
     class Meta:
         constraints = [
-            models.UniqueConstraint(fields=['row', 'seat', 'flight'], name='unique_row_seat_flight')
+            models.UniqueConstraint(
+                fields=['row', 'seat', 'flight'],
+                condition=models.Q(released=False),
+                name='unique_row_seat_flight',
+            )
         ]
 
     @staticmethod
-    def validate_ticket(row, seat_number, flight, error_to_raise):
-        airplane = flight.airplane
-
+    def validate_ticket(row, seat_number, flight, error_to_raise, user_id=None):
         if row is not None:
-            # Check if row exists for the given aircraft
-            matching_rows = Seat.objects.filter(
-                airplane=airplane,
-                row=row
-            )
-
-            if not matching_rows.exists():
-                raise error_to_raise({
-                    "row": f"Row number {row} does not exist for the specified airplane."
-                })
+            # Check if row and seat exist for the given aircraft
+            layout_error = Ticket.get_layout_error(row, seat_number, flight.airplane)
+            if layout_error:
+                raise error_to_raise(layout_error)
 
-            # Если row валиден, проверяем seat_number
+            # Seats on hold can only be booked by the user holding them
             if seat_number is not None:
-                matching_seats = matching_rows.filter(seat_number=seat_number)
-
-                if not matching_seats.exists():
-                    raise error_to_raise({
-                        "seat": f"Seat number {seat_number} does not exist for the specified airplane and row {row}."
-                    })
+                holder_id = get_seat_hold_backend().get_holder(flight.pk, row, seat_number)
+                if holder_id is not None and holder_id != user_id:
+                    raise error_to_raise(Ticket.get_held_error(row, seat_number))
 
             seat = seat_number
             # Check if there are no existing tickets with the specified row and seat for the given flight
-            existing_tickets = Ticket.objects.filter(flight=flight, seat=seat, row=row)
+            existing_tickets = Ticket.objects.filter(flight=flight, seat=seat, row=row, released=False)
             if existing_tickets.exists():
-                raise error_to_raise({
-                    "row": f"Ticket with row number {row} and seat {seat} already exists for the specified flight."
-                })
+                raise error_to_raise(Ticket.get_taken_error(row, seat))
         else:
             # If both seat_number and row are None, consider it valid
             pass
 
+    @staticmethod
+    def get_layout_error(row, seat_number, airplane):
+        if not airplane.has_row(row):
+            return {"row": f"Row number {row} does not exist for the specified airplane."}
+
+        if seat_number is not None and not airplane.has_seat(row, seat_number):
+            return {"seat": f"Seat number {seat_number} does not exist for the specified airplane and row {row}."}
+
+        return None
+
+    @staticmethod
+    def get_taken_error(row, seat):
+        return {"row": f"Ticket with row number {row} and seat {seat} already exists for the specified flight."}
+
+    @staticmethod
+    def get_held_error(row, seat):
+        return {"seat": f"Seat number {seat} in row {row} is on hold for another customer."}
+
+    @staticmethod
+    def validate_tickets(tickets_data, seat_maps=None, user_id=None):
+        """Check all requested seats of an order at once.
+
+        Loads the taken seats once per flight and returns one error dict per
+        ticket (empty when the ticket is valid), in the order of tickets_data.
+        """
+        seat_maps = {} if seat_maps is None else seat_maps
+        requested = set()
+        errors = []
+
+        for ticket_data in tickets_data:
+            row, seat, flight = ticket_data.get("row"), ticket_data.get("seat"), ticket_data["flight"]
+            error = {}
+
+            if row is not None:
+                if flight.pk not in seat_maps:
+                    seat_maps[flight.pk] = flight.seat_map(user_id)
+
+                error = Ticket.get_layout_error(row, seat, flight.airplane) or {}
+                if not error and seat is not None:
+                    if (flight.pk, row, seat) in requested:
+                        error = {"row": f"Row number {row} and seat {seat} are requested more than once."}
+                    elif (row, seat) in seat_maps[flight.pk].held:
+                        error = Ticket.get_held_error(row, seat)
+                    elif not seat_maps[flight.pk].is_free(row, seat):
+                        error = Ticket.get_taken_error(row, seat)
+                    requested.add((flight.pk, row, seat))
+
+            errors.append(error)
+
+        return errors
+
     def __str__(self):
         return f"{str(self.flight)} (row: {self.row}, seat: {self.seat})"
 
@@ -349,28 +729,35 @@ class Ticket(models.Model):
                 self.type = 'completed'
                 self.save()
 
-    def get_last_available_seat(self):
-        airplane = self.flight.airplane
-
-        # Assuming there is a related Seat model with a field seat_number
-        # and it has a foreign key to Airplane
-        rows = Seat.objects.filter(airplane=airplane).values_list('row', flat=True).distinct().order_by("row")
-
-        # Iterate through each row
-        for row in rows:
-            booked_seats_in_row = Ticket.objects.filter(flight=self.flight, row=row)
+    def allocate_order_seats(self):
+        # Seat this ticket together with the other unseated pending tickets of its order on the same flight,
+        # unseated meaning without a row or a seat like in Flight.allocate_pending_seats()
+        with transaction.atomic():
+            Flight.objects.select_for_update().filter(pk=self.flight_id).first()
+            tickets = list(
+                Ticket.objects.select_for_update()
+                .filter(
+                    models.Q(row__isnull=True) | models.Q(seat__isnull=True),
+                    order_id=self.order_id,
+                    flight_id=self.flight_id,
+                    type='check-in-pending',
+                    released=False,
+                )
+                .order_by("id")
+            )
+            if self.pk not in {ticket.pk for ticket in tickets}:
+                raise ValidationError({"error": "Ticket is not waiting for a seat"})
+            seats = self.flight.seat_map().allocate_group(len(tickets))
 
-            # max number of seat in row
-            max_seat_in_row = self.get_max_seat_in_row()
+            for ticket, (row, seat) in zip(tickets, seats):
+                ticket.row, ticket.seat, ticket.type = row, seat, 'completed'
+            Ticket.objects.bulk_update(tickets[:len(seats)], ["row", "seat", "type"])
 
-            # first free seat in a row
-            for seat_number in range(1, max_seat_in_row + 1):
-                if not booked_seats_in_row.filter(seat=seat_number).exists():
-                    return row, seat_number
-                    # Если свободное место найдено, выходим из цикла
-                    break
+        return tickets[:len(seats)]
 
-            return None, None
+    def get_last_available_seat(self):
+        # first free seat (lowest row, then lowest seat number) from the flight occupancy bitmap
+        return self.flight.seat_map().first_free()
 
     def get_max_seat_in_row(self):
         # Get the related Airplane for the current Ticket
@@ -394,22 +781,40 @@ class Ticket(models.Model):
             self.seat,
             self.flight,
             ValidationError,
+            user_id=self.order.user_id,
         )
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         self.full_clean()
 
-        if self.pk and force_update:
-            super(Ticket, self).save(force_update=True,
-                                     using=using,
-                                     update_fields=update_fields)
+        with transaction.atomic(using=using):
+            if self.pk and force_update:
+                super(Ticket, self).save(force_update=True,
+                                         using=using,
+                                         update_fields=update_fields)
 
-        elif force_insert:
-            super(Ticket, self).save(force_insert=True,
-                                     using=using)
-        else:
-            super(Ticket, self).save(using=using,
-                                     update_fields=update_fields)
+            elif force_insert:
+                super(Ticket, self).save(force_insert=True,
+                                         using=using)
+            else:
+                super(Ticket, self).save(using=using,
+                                         update_fields=update_fields)
+
+
+class SeatHold(models.Model):
+    flight = models.ForeignKey(Flight, related_name="seat_holds", on_delete=models.CASCADE)
+    row = models.IntegerField()
+    seat = models.IntegerField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['row', 'seat', 'flight'], name='unique_hold_row_seat_flight')
+        ]
+
+    def __str__(self):
+        return f"{str(self.flight)} (row: {self.row}, seat: {self.seat}) until {self.expires_at}"
 
 
 class AirlineRating(models.Model):
@@ -435,4 +840,232 @@ class AirlineRating(models.Model):
     created_time = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ["-created_time"]
\ No newline at end of file
+        ordering = ["-created_time"]
+        # the keyset AirlineRatingPagination seeks on
+        indexes = [models.Index(fields=["created_time", "id"], name="rating_created_keyset_idx")]
+
+    def save(self, *args, **kwargs):
+        # the totals are moved by the receivers in airport_system.signals, in the same transaction;
+        # bulk_create() sends no signal, its callers pass the ratings to add_ratings() themselves
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class RatingTotals(models.Model):
+    """Sums and non-null counts of AirlineRating scores, per category."""
+
+    CATEGORIES = {
+        'avg_boarding_deplaining': 'boarding_deplaining',
+        'avg_crew': 'crew',
+        'avg_services': 'services',
+        'avg_entertainment': 'entertainment',
+        'avg_wi_fi': 'wi_fi',
+    }
+
+    ratings_count = models.PositiveIntegerField(default=0)
+
+    boarding_deplaining_sum = models.PositiveIntegerField(default=0)
+    boarding_deplaining_count = models.PositiveIntegerField(default=0)
+    crew_sum = models.PositiveIntegerField(default=0)
+    crew_count = models.PositiveIntegerField(default=0)
+    services_sum = models.PositiveIntegerField(default=0)
+    services_count = models.PositiveIntegerField(default=0)
+    entertainment_sum = models.PositiveIntegerField(default=0)
+    entertainment_count = models.PositiveIntegerField(default=0)
+    wi_fi_sum = models.PositiveIntegerField(default=0)
+    wi_fi_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def averages(self):
+        # None for a category nobody rated, the way Avg() reports it
+        return {
+            average: getattr(self, f"{category}_sum") / getattr(self, f"{category}_count")
+            if getattr(self, f"{category}_count") else None
+            for average, category in self.CATEGORIES.items()
+        }
+
+    @classmethod
+    def total_fields(cls):
+        fields = ["ratings_count"]
+        for category in cls.CATEGORIES.values():
+            fields += [f"{category}_sum", f"{category}_count"]
+        return fields
+
+    @classmethod
+    def rating_changes(cls, ratings, sign):
+        # F() updates adding (or with sign=-1 removing) the ratings to the totals
+        totals = dict.fromkeys(cls.total_fields(), 0)
+        for rating in ratings:
+            totals["ratings_count"] += 1
+            for category in cls.CATEGORIES.values():
+                value = getattr(rating, f"{category}_rating")
+                if value is not None:
+                    totals[f"{category}_sum"] += value
+                    totals[f"{category}_count"] += 1
+
+        return {field: F(field) + sign * value for field, value in totals.items() if value}
+
+    @staticmethod
+    def group_ratings(ratings, key):
+        groups = {}
+        for rating in ratings:
+            groups.setdefault(key(rating), []).append(rating)
+        return groups.items()
+
+    @classmethod
+    def rating_columns(cls):
+        # aggregates computing the totals straight from AirlineRating rows
+        columns = {"ratings_count": Count("id")}
+        for category in cls.CATEGORIES.values():
+            columns[f"{category}_sum"] = Sum(f"{category}_rating", default=0)
+            columns[f"{category}_count"] = Count(f"{category}_rating")
+        return columns
+
+
+class AirlineRatingAggregate(RatingTotals):
+    """Running totals of all the ratings of an airline.
+
+    Kept up to date by AirlineRating.save() and delete(), so averages are read
+    without scanning the ratings. Rebuild with the rebuild_rating_aggregates command
+    after bulk changes.
+    """
+
+    airline = models.OneToOneField(
+        Airline, on_delete=models.CASCADE, primary_key=True, related_name="rating_aggregate"
+    )
+    # Airline.overall_rating of the totals, stored and indexed for the leaderboard
+    overall_score = models.FloatField(default=0, db_index=True)
+
+    @classmethod
+    def add_ratings(cls, ratings, sign=1):
+        updated = []
+        for airline_id, group in cls.group_ratings(ratings, lambda rating: rating.airline_id):
+            if cls.objects.filter(airline_id=airline_id).update(**cls.rating_changes(group, sign)):
+                updated.append(airline_id)
+            elif sign > 0:
+                # first ratings of the airline, count everything once instead
+                cls.rebuild(airline_ids=[airline_id])
+            # nothing to take ratings off, the aggregate went with its airline
+
+        if updated:
+            cls.refresh_scores(cls.objects.filter(airline_id__in=updated))
+
+    @classmethod
+    def refresh_scores(cls, aggregates):
+        aggregates = list(aggregates)
+        for aggregate in aggregates:
+            aggregate.compute_score()
+        cls.objects.bulk_update(aggregates, ["overall_score"])
+
+    def compute_score(self):
+        self.overall_score = Airline.weigh_ratings(self.averages())['overall_rating']
+
+    def get_rank(self):
+        # Competition rank, airlines with the same score share it. Counts a range of the score index
+        return AirlineRatingAggregate.objects.filter(
+            ratings_count__gt=0, overall_score__gt=self.overall_score
+        ).count() + 1
+
+    @classmethod
+    def rebuild(cls, airline_ids=None):
+        """Recompute the aggregates from the ratings, returns how many were written."""
+        ratings = AirlineRating.objects.all()
+        aggregates = cls.objects.all()
+        if airline_ids is not None:
+            ratings = ratings.filter(airline_id__in=airline_ids)
+            aggregates = aggregates.filter(airline_id__in=airline_ids)
+
+        rows = ratings.values("airline_id").annotate(**cls.rating_columns()).order_by()
+
+        created = [cls(**row) for row in rows]
+        for aggregate in created:
+            aggregate.compute_score()
+
+        with transaction.atomic():
+            aggregates.delete()
+            cls.objects.bulk_create(created)
+        return len(created)
+
+    def __str__(self):
+        return f"{self.airline.name} ({self.ratings_count} ratings)"
+
+
+class AirlineRatingDailyBucket(RatingTotals):
+    """Totals of the ratings an airline received on one day.
+
+    Windowed and decayed scores sum a bounded number of these instead of the
+    rating history.
+    """
+
+    # Buckets older than this many half-lives weigh under 0.1% and are skipped
+    DECAY_HORIZON = 10
+    # Longest window or half-life accepted, in days
+    MAX_PERIOD_DAYS = 3650
+
+    airline = models.ForeignKey(Airline, on_delete=models.CASCADE, related_name="rating_buckets")
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['airline', 'day'], name='unique_rating_bucket_airline_day')
+        ]
+
+    @classmethod
+    def add_ratings(cls, ratings, sign=1):
+        groups = cls.group_ratings(
+            ratings, lambda rating: (rating.airline_id, timezone.localdate(rating.created_time))
+        )
+        for (airline_id, day), group in groups:
+            changes = cls.rating_changes(group, sign)
+            buckets = cls.objects.filter(airline_id=airline_id, day=day)
+            if not buckets.update(**changes) and sign > 0:
+                cls.objects.get_or_create(airline_id=airline_id, day=day)
+                buckets.update(**changes)
+
+    @classmethod
+    def rebuild(cls, airline_ids=None):
+        ratings = AirlineRating.objects.all()
+        buckets = cls.objects.all()
+        if airline_ids is not None:
+            ratings = ratings.filter(airline_id__in=airline_ids)
+            buckets = buckets.filter(airline_id__in=airline_ids)
+
+        rows = (
+            ratings.annotate(day=TruncDate("created_time"))
+            .values("airline_id", "day")
+            .annotate(**cls.rating_columns())
+            .order_by()
+        )
+
+        with transaction.atomic():
+            buckets.delete()
+            created = cls.objects.bulk_create([cls(**row) for row in rows])
+        return len(created)
+
+    @classmethod
+    def recent_averages(cls, airline_id, window_days=None, half_life_days=None, today=None):
+        """Category averages over the last window_days days, today included.
+
+        With half_life_days every day is weighted by 0.5 ** (age / half_life_days),
+        within the window or DECAY_HORIZON half-lives when no window is given.
+        """
+        today = today or timezone.localdate()
+        days = window_days or math.ceil(cls.DECAY_HORIZON * half_life_days)
+        buckets = cls.objects.filter(airline_id=airline_id, day__gt=today - timedelta(days=days))
+        fields = cls.total_fields()
+
+        if not half_life_days:
+            totals = buckets.aggregate(**{field: Sum(field, default=0) for field in fields})
+            return cls(**totals).averages()
+
+        totals = dict.fromkeys(fields, 0)
+        for bucket in buckets.values("day", *fields):
+            weight = 0.5 ** ((today - bucket["day"]).days / half_life_days)
+            for field in fields:
+                totals[field] += bucket[field] * weight
+        return cls(**totals).averages()
+
+    def __str__(self):
+        return f"{self.airline.name} on {self.day} ({self.ratings_count} ratings)"
@@ -0,0 +1,140 @@
+"""Lookups of cities, countries and airports by name.
+
+Cities and countries have an indexed search_name column holding the name
+normalized like the gazetteer keys, so a search is a prefix match on an
+index instead of an icontains scan. On PostgreSQL, ROUTE_SEARCH_TRIGRAM adds
+misspelled matches through pg_trgm.
+
+Autocompletion is served from memory, by AutocompleteIndex.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+from airport_system.geocoding import normalize_place_name
+
+
+def use_trigrams(alias):
+    return getattr(settings, "ROUTE_SEARCH_TRIGRAM", False) and connections[alias].vendor == "postgresql"
+
+
+def matching_names(queryset, term, normalize=normalize_place_name):
+    """Rows of queryset whose search_name starts with the normalized term."""
+    term = normalize(term)
+    condition = Q(search_name__startswith=term)
+    if use_trigrams(queryset.db):
+        condition |= Q(search_name__trigram_word_similar=term)
+    return queryset.filter(condition)
+
+
+# match kinds, the better first
+IATA_MATCH, NAME_MATCH, WORD_MATCH = range(3)
+MAX_CANDIDATES = 500
+
+
+class AutocompleteIndex:
+    """Sorted array of normalized keys of airports and cities for prefix lookups.
+
+    An airport is found by its IATA code, its name and every word of its
+    name, a city by its name and every word of it.
+    """
+
+    def __init__(self, airports=(), cities=()):
+        # airports are (id, name, iata code, city name, country name), cities (id, name, country name)
+        rows = []
+        for airport_id, name, iata_code, city, country in airports:
+            suggestion = {
+                "type": "airport", "id": airport_id, "name": name,
+                "iata_code": iata_code, "city": city, "country": country,
+            }
+            if iata_code:
+                rows.append((iata_code.casefold(), IATA_MATCH, suggestion))
+            rows.extend(self._name_keys(name, suggestion))
+        for city_id, name, country in cities:
+            suggestion = {
+                "type": "city", "id": city_id, "name": name,
+                "iata_code": None, "city": name, "country": country,
+            }
+            rows.extend(self._name_keys(name, suggestion))
+
+        rows.sort(key=lambda row: row[0])
+        self._keys = [key for key, _, _ in rows]
+        self._entries = [(match, suggestion) for _, match, suggestion in rows]
+
+    @staticmethod
+    def _name_keys(name, suggestion):
+        words = normalize_place_name(name).split()
+        yield " ".join(words), NAME_MATCH, suggestion
+        for start in range(1, len(words)):
+            yield " ".join(words[start:]), WORD_MATCH, suggestion
+
+    def __len__(self):
+        return len(self._keys)
+
+    def complete(self, prefix, limit=10, kind=None):
+        """Up to limit suggestions for prefix, IATA codes first, then names, then words inside names.
+
+        Within a kind of match airports come before cities, and shorter names first.
+        Only the first MAX_CANDIDATES keys starting with prefix are ranked.
+        """
+        prefix = normalize_place_name(prefix)
+        if not prefix:
+            return []
+
+        best = {}
+        index = bisect_left(self._keys, prefix)
+        for key, (match, suggestion) in zip(
+            self._keys[index:index + MAX_CANDIDATES], self._entries[index:index + MAX_CANDIDATES]
+        ):
+            if not key.startswith(prefix):
+                break
+            if kind is not None and suggestion["type"] != kind:
+                continue
+            if match == IATA_MATCH and key != prefix:
+                match = NAME_MATCH
+            rank = (match, suggestion["type"] != "airport", len(suggestion["name"]), suggestion["name"])
+            identity = (suggestion["type"], suggestion["id"])
+            if identity not in best or rank < best[identity][0]:
+                best[identity] = (rank, suggestion)
+
+        return [suggestion for _, suggestion in sorted(best.values(), key=lambda item: item[0])[:limit]]
+
+    @classmethod
+    def from_database(cls):
+        Airport = apps.get_model("airport_system", "Airport")
+        City = apps.get_model("airport_system", "City")
+
+        return cls(
+            Airport.objects.values_list(
+                "pk", "name", "iata_code", "closest_big_city__name", "closest_big_city__country__name"
+            ),
+            City.objects.values_list("pk", "name", "country__name"),
+        )
+
+
+_index = None
+_built_at = 0
+_lock = threading.Lock()
+
+
+def get_autocomplete_index():
+    """The index of this process, rebuilt after an invalidation or AUTOCOMPLETE_INDEX_TTL seconds."""
+    global _index, _built_at
+
+    with _lock:
+        if _index is None or time.monotonic() - _built_at > getattr(settings, "AUTOCOMPLETE_INDEX_TTL", 300):
+            _index = AutocompleteIndex.from_database()
+            _built_at = time.monotonic()
+        return _index
+
+
+def invalidate_autocomplete_index():
+    global _index
+
+    with _lock:
+        _index = None
@@ -0,0 +1,91 @@
+import json
+import operator
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """Cursor pagination seeking on every ordering field, the last one unique.
+
+    DRF's CursorPagination seeks on the first ordering field only and skips
+    rows sharing its value with an OFFSET. Here the cursor holds the values
+    of all ordering fields of the row the page starts after, so every page
+    is one indexed range query, without a count, however deep it is. The
+    ordering fields must not be nullable.
+    """
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        if reverse:
+            queryset = queryset.order_by(*(self._flip(field) for field in self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.cursor is not None and self.cursor.position is not None:
+            queryset = queryset.filter(self._after(queryset.model, self.cursor.position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.cursor is not None and self.cursor.position is not None
+        return self.page
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def _after(self, model, position, reverse):
+        # (a, b) > (x, y) is a > x or (a = x and b > y), with < for descending fields
+        try:
+            values = json.loads(position)
+            fields = [field.lstrip("-") for field in self.ordering]
+            values = [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+        except (ValueError, TypeError, LookupError, ValidationError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        conditions = []
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            descending = field.startswith("-") != reverse
+            name = field.lstrip("-")
+            conditions.append(equal & Q(**{f"{name}__{'lt' if descending else 'gt'}": value}))
+            equal &= Q(**{name: value})
+        return reduce(operator.or_, conditions)
+
+    def _position(self, instance):
+        values = [getattr(instance, field.lstrip("-")) for field in self.ordering]
+        return json.dumps([value.isoformat() if hasattr(value, "isoformat") else value for value in values])
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._position(self.page[0])))
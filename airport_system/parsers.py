@@ -0,0 +1,31 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Newline delimited JSON, one object per line.
+
+    Lines are decoded lazily as the data is consumed and yielded as
+    (line number, object) pairs, lines numbered from 1 and blank lines
+    skipped. A line that is not valid JSON is yielded with a ParseError in
+    place of its object, so the caller can report it and go on.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", "utf-8")
+        return self._records(stream, encoding)
+
+    @staticmethod
+    def _records(stream, encoding):
+        for line_number, line in enumerate(stream, start=1):
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as exc:
+                yield line_number, ParseError(f"NDJSON parse error - {exc}")
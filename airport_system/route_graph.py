@@ -0,0 +1,190 @@
+"""In-memory graph of upcoming flights for multi-leg itinerary search.
+
+Every airport keeps its departures sorted by departure time, a search only
+looks at the departures inside the connection window of each stop. Saving or
+deleting a flight or a route patches the graph of this process in place once
+the transaction commits (see airport_system.signals), other processes pick
+the change up when their graph expires after ROUTE_GRAPH_TTL seconds.
+"""
+import heapq
+import itertools
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+
+MAX_EXPANSIONS = 20000
+
+
+def get_min_connection():
+    return timedelta(minutes=getattr(settings, "ITINERARY_MIN_CONNECTION_MINUTES", 45))
+
+
+def get_max_layover():
+    return timedelta(hours=getattr(settings, "ITINERARY_MAX_LAYOVER_HOURS", 24))
+
+
+class FlightGraph:
+    def __init__(self, flights=()):
+        # flights are (flight id, route id, source id, destination id, departure, arrival)
+        self._flights = {}
+        self._departures = {}
+        self._route_flights = {}
+        for flight in flights:
+            self.add_flight(*flight)
+
+    def __len__(self):
+        return len(self._flights)
+
+    def add_flight(self, flight_id, route_id, source_id, destination_id, departure, arrival):
+        self.remove_flight(flight_id)
+        self._flights[flight_id] = (route_id, source_id, destination_id, departure, arrival)
+        insort(self._departures.setdefault(source_id, []), (departure, flight_id))
+        self._route_flights.setdefault(route_id, set()).add(flight_id)
+
+    def remove_flight(self, flight_id):
+        if flight_id not in self._flights:
+            return
+        route_id, source_id, _, departure, _ = self._flights.pop(flight_id)
+        departures = self._departures[source_id]
+        del departures[bisect_left(departures, (departure, flight_id))]
+        self._route_flights[route_id].discard(flight_id)
+
+    def move_route(self, route_id, source_id, destination_id):
+        for flight_id in list(self._route_flights.get(route_id, ())):
+            _, _, _, departure, arrival = self._flights[flight_id]
+            self.add_flight(flight_id, route_id, source_id, destination_id, departure, arrival)
+
+    def remove_route(self, route_id):
+        for flight_id in list(self._route_flights.pop(route_id, ())):
+            self.remove_flight(flight_id)
+
+    def search(self, origin_id, destination_id, earliest, latest_departure, k=3, max_legs=3,
+               min_connection=None, max_layover=None):
+        """Up to k itineraries from origin to destination, the earliest arrival first.
+
+        Itineraries leave origin between earliest and latest_departure and are
+        returned as (departure, arrival, [flight ids]). Every connection leaves
+        at least min_connection and at most max_layover after the previous
+        arrival, no airport is visited twice. There is no itinerary from an
+        airport to itself.
+        """
+        if origin_id == destination_id:
+            return []
+        min_connection = get_min_connection() if min_connection is None else min_connection
+        max_layover = get_max_layover() if max_layover is None else max_layover
+        counter = itertools.count()
+        # (arrival, legs, tie breaker, airport, departure, flight ids, visited airports)
+        queue = [(earliest, 0, next(counter), origin_id, None, (), frozenset([origin_id]))]
+        # label setting on arrival time, an airport is expanded at most k times
+        expanded = {}
+        itineraries = []
+
+        with _lock:
+            for _ in range(MAX_EXPANSIONS):
+                if not queue or len(itineraries) == k:
+                    break
+                arrival, legs, _, airport_id, departure, path, visited = heapq.heappop(queue)
+                if airport_id == destination_id:
+                    itineraries.append((departure, arrival, list(path)))
+                    continue
+                expanded[airport_id] = expanded.get(airport_id, 0) + 1
+                if expanded[airport_id] > k or legs == max_legs:
+                    continue
+
+                if legs:
+                    window = arrival + min_connection, arrival + max_layover
+                else:
+                    window = earliest, latest_departure
+                for flight_id in self._flight_ids_between(airport_id, *window):
+                    _, _, next_airport_id, next_departure, next_arrival = self._flights[flight_id]
+                    if next_airport_id in visited:
+                        continue
+                    heapq.heappush(queue, (
+                        next_arrival, legs + 1, next(counter), next_airport_id,
+                        departure or next_departure, path + (flight_id,), visited | {next_airport_id},
+                    ))
+        return itineraries
+
+    def _flight_ids_between(self, airport_id, earliest, latest):
+        departures = self._departures.get(airport_id, [])
+        for index in range(bisect_left(departures, (earliest, -1)), len(departures)):
+            departure, flight_id = departures[index]
+            if departure > latest:
+                return
+            yield flight_id
+
+    @staticmethod
+    def bookable_flights(flights):
+        """(flight id, route id, source id, destination id, departure, arrival) of upcoming flights."""
+        flights = flights.exclude(status="failed").filter(departure_time__gte=timezone.now())
+        for flight_id, route_id, source_id, destination_id, departure, estimated, real in flights.values_list(
+            "pk", "route_id", "route__source_id", "route__standard_destination_id",
+            "departure_time", "estimated_arrival_time", "real_arrival_time",
+        ):
+            yield flight_id, route_id, source_id, destination_id, departure, real or estimated
+
+    @classmethod
+    def from_database(cls):
+        Flight = apps.get_model("airport_system", "Flight")
+        return cls(cls.bookable_flights(Flight.objects.all()))
+
+
+_graph = None
+_built_at = 0
+_lock = threading.RLock()
+
+
+def get_flight_graph():
+    """The graph of this process, rebuilt after ROUTE_GRAPH_TTL seconds."""
+    global _graph, _built_at
+
+    with _lock:
+        if _graph is None or time.monotonic() - _built_at > getattr(settings, "ROUTE_GRAPH_TTL", 300):
+            _graph = FlightGraph.from_database()
+            _built_at = time.monotonic()
+        return _graph
+
+
+def invalidate_flight_graph():
+    global _graph
+
+    with _lock:
+        _graph = None
+
+
+def _update(method, *args):
+    # a graph not built yet will read the change from the database
+    with _lock:
+        if _graph is not None:
+            getattr(_graph, method)(*args)
+
+
+def flight_saved(flight_id):
+    with _lock:
+        if _graph is None:
+            return
+        Flight = apps.get_model("airport_system", "Flight")
+        # read back from the database, the instance may hold unparsed values
+        flights = list(FlightGraph.bookable_flights(Flight.objects.filter(pk=flight_id)))
+        if flights:
+            _graph.add_flight(*flights[0])
+        else:
+            _graph.remove_flight(flight_id)
+
+
+def flight_deleted(flight_id):
+    _update("remove_flight", flight_id)
+
+
+def route_saved(route_id, source_id, destination_id):
+    _update("move_route", route_id, source_id, destination_id)
+
+
+def route_deleted(route_id):
+    _update("remove_route", route_id)
@@ -0,0 +1,203 @@
+import threading
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+DEFAULT_BACKEND = "airport_system.seat_holds.DatabaseSeatHoldBackend"
+
+
+def get_hold_ttl():
+    return timedelta(seconds=getattr(settings, "SEAT_HOLD_TTL", 300))
+
+
+def get_max_holds_per_user():
+    return getattr(settings, "SEAT_HOLD_MAX_PER_USER", 10)
+
+
+class HoldLimitExceeded(Exception):
+    """The user already holds limit seats of the flight."""
+
+    def __init__(self, limit):
+        super().__init__(f"You can hold at most {limit} seats of a flight at a time.")
+        self.limit = limit
+
+
+class DatabaseSeatHoldBackend:
+    """Holds shared by every process, stored in the SeatHold table."""
+
+    def __init__(self):
+        self.model = apps.get_model("airport_system", "SeatHold")
+        self.user_model = apps.get_model(settings.AUTH_USER_MODEL)
+
+    def hold(self, flight_id, row, seat, user_id, expires_at, limit=None):
+        """Hold the seat for the user, False when somebody else holds it.
+
+        Raises HoldLimitExceeded when the user would hold more than limit seats of the flight.
+        """
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                self.model.objects.filter(flight_id=flight_id, row=row, seat=seat, expires_at__lte=now).delete()
+                current = self.model.objects.select_for_update().filter(flight_id=flight_id, row=row, seat=seat).first()
+
+                if current is None:
+                    if limit is not None:
+                        # the user row is locked, so parallel holds of one user are counted one after another
+                        self.user_model.objects.select_for_update().filter(pk=user_id).exists()
+                        held = self.model.objects.filter(
+                            flight_id=flight_id, user_id=user_id, expires_at__gt=now
+                        ).count()
+                        if held >= limit:
+                            raise HoldLimitExceeded(limit)
+                    self.model.objects.create(
+                        flight_id=flight_id, row=row, seat=seat, user_id=user_id, expires_at=expires_at
+                    )
+                    return True
+                if current.user_id != user_id:
+                    return False
+
+                current.expires_at = expires_at
+                current.save(update_fields=["expires_at"])
+                return True
+        except IntegrityError:
+            # somebody else created the hold in between
+            return False
+
+    def release(self, flight_id, seats, user_id):
+        for row, seat in seats:
+            self.model.objects.filter(flight_id=flight_id, row=row, seat=seat, user_id=user_id).delete()
+
+    def get_holder(self, flight_id, row, seat):
+        return self.model.objects.filter(
+            flight_id=flight_id, row=row, seat=seat, expires_at__gt=timezone.now()
+        ).values_list("user_id", flat=True).first()
+
+    def active_holds(self, flight_id):
+        holds = self.model.objects.filter(flight_id=flight_id, expires_at__gt=timezone.now())
+        return {(row, seat): user_id for row, seat, user_id in holds.values_list("row", "seat", "user_id")}
+
+    def purge_expired(self):
+        deleted, _ = self.model.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class LocalMemorySeatHoldBackend:
+    """Holds kept in this process only, for single process deployments."""
+
+    def __init__(self):
+        self._holds = {}
+        self._lock = threading.Lock()
+
+    def hold(self, flight_id, row, seat, user_id, expires_at, limit=None):
+        now = timezone.now()
+        with self._lock:
+            current = self._holds.get((flight_id, row, seat))
+            if current and current[0] != user_id and current[1] > now:
+                return False
+            renewal = current is not None and current[0] == user_id and current[1] > now
+            if limit is not None and not renewal:
+                held = sum(
+                    1 for (hold_flight_id, _, _), (holder, hold_expires_at) in self._holds.items()
+                    if hold_flight_id == flight_id and holder == user_id and hold_expires_at > now
+                )
+                if held >= limit:
+                    raise HoldLimitExceeded(limit)
+            self._holds[(flight_id, row, seat)] = (user_id, expires_at)
+            return True
+
+    def release(self, flight_id, seats, user_id):
+        with self._lock:
+            for row, seat in seats:
+                current = self._holds.get((flight_id, row, seat))
+                if current and current[0] == user_id:
+                    del self._holds[(flight_id, row, seat)]
+
+    def get_holder(self, flight_id, row, seat):
+        current = self._holds.get((flight_id, row, seat))
+        if current and current[1] > timezone.now():
+            return current[0]
+        return None
+
+    def active_holds(self, flight_id):
+        now = timezone.now()
+        with self._lock:
+            return {
+                (row, seat): user_id
+                for (hold_flight_id, row, seat), (user_id, expires_at) in self._holds.items()
+                if hold_flight_id == flight_id and expires_at > now
+            }
+
+    def purge_expired(self):
+        now = timezone.now()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._holds.items() if expires_at <= now]
+            for key in expired:
+                del self._holds[key]
+        return len(expired)
+
+
+class SeatHoldSweeper(threading.Thread):
+    """Daemon thread releasing expired holds every interval seconds.
+
+    Expired holds are already ignored on read, sweeping only keeps the store small.
+    """
+
+    def __init__(self, backend, interval):
+        super().__init__(name="seat-hold-sweeper", daemon=True)
+        self.backend = backend
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep_once()
+            finally:
+                # the thread keeps its own connection, don't let it go stale between sweeps
+                close_old_connections()
+
+    def sweep_once(self):
+        return self.backend.purge_expired()
+
+    def stop(self):
+        self._stopped.set()
+
+
+# one instance per backend path, the memory backend keeps its holds for the process
+_backends = {}
+_sweeper = None
+_lock = threading.Lock()
+
+
+def get_seat_hold_backend():
+    """The backend named by SEAT_HOLD_BACKEND now, read again on every call."""
+    path = getattr(settings, "SEAT_HOLD_BACKEND", DEFAULT_BACKEND)
+
+    with _lock:
+        if path not in _backends:
+            _backends[path] = import_string(path)()
+        return _backends[path]
+
+
+def ensure_sweeper_started():
+    # Started lazily by the first hold, so management commands and tests don't spawn it
+    global _sweeper
+
+    interval = getattr(settings, "SEAT_HOLD_SWEEP_INTERVAL", 60)
+    if not interval:
+        return None
+
+    backend = get_seat_hold_backend()
+    with _lock:
+        if _sweeper is None or not _sweeper.is_alive() or _sweeper.backend is not backend:
+            if _sweeper is not None:
+                # the backend setting changed, sweep the new one instead
+                _sweeper.stop()
+            _sweeper = SeatHoldSweeper(backend, interval)
+            _sweeper.start()
+        return _sweeper
@@ -0,0 +1,135 @@
+class SeatMap:
+    """Per-flight seat occupancy kept as one integer bitmask per row.
+
+    Bit ``n - 1`` of a row mask stands for seat number ``n`` of that row.
+    """
+
+    def __init__(self, seats, taken=()):
+        self.layout = {}
+        self.taken = {}
+        self.held = set()
+
+        for row, seat_number in seats:
+            self.layout[row] = self.layout.get(row, 0) | (1 << (seat_number - 1))
+
+        for row, seat_number in taken:
+            self.book(row, seat_number)
+
+    @classmethod
+    def from_layout(cls, seat_layout, taken=(), held=()):
+        # seat_layout is a seat bitmask per row, index 0 being row 1,
+        # held seats are on hold for somebody else and count as taken
+        seat_map = cls(())
+        for row, mask in enumerate(seat_layout, start=1):
+            if mask:
+                seat_map.layout[row] = mask
+
+        for row, seat_number in taken:
+            seat_map.book(row, seat_number)
+        for row, seat_number in held:
+            seat_map.held.add((row, seat_number))
+            seat_map.book(row, seat_number)
+        return seat_map
+
+    def rows(self):
+        return sorted(self.layout)
+
+    def has_seat(self, row, seat_number):
+        if seat_number is None or seat_number < 1:
+            return False
+        return bool(self.layout.get(row, 0) >> (seat_number - 1) & 1)
+
+    def is_free(self, row, seat_number):
+        return self.has_seat(row, seat_number) and not self.taken.get(row, 0) >> (seat_number - 1) & 1
+
+    def free_mask(self, row):
+        return self.layout.get(row, 0) & ~self.taken.get(row, 0)
+
+    def free_count(self):
+        return sum(bin(self.free_mask(row)).count("1") for row in self.layout)
+
+    def book(self, row, seat_number):
+        if row is None or seat_number is None:
+            return
+        self.taken[row] = self.taken.get(row, 0) | (1 << (seat_number - 1))
+
+    def free_seats(self):
+        # Free seats in allocation order, lowest row first then lowest seat number
+        for row in self.rows():
+            mask = self.free_mask(row)
+            while mask:
+                lowest = mask & -mask
+                yield row, lowest.bit_length()
+                mask ^= lowest
+
+    @staticmethod
+    def _runs(mask, size):
+        # bit n stays set only if seats n + 1 .. n + size are all free
+        runs = mask
+        for shift in range(1, size):
+            runs &= mask >> shift
+        return runs
+
+    def find_block(self, size, rows=None):
+        for row in self.rows() if rows is None else rows:
+            runs = self._runs(self.free_mask(row), size)
+            if runs:
+                return row, (runs & -runs).bit_length()
+        return None
+
+    def longest_block(self, row, limit):
+        # Longest run of free seats in the row, capped at limit, as (length, first seat)
+        mask = self.free_mask(row)
+        length, start = 0, None
+        runs = mask
+        while runs and length < limit:
+            length += 1
+            start = (runs & -runs).bit_length()
+            runs &= mask >> length
+        return length, start
+
+    def allocate_group(self, size):
+        """Book seats for a group, side by side in one row when possible.
+
+        Otherwise the group is split into as few blocks as possible, preferring
+        rows close to the first block. Returns fewer than size seats only
+        when the flight runs out of free seats.
+        """
+        block = self.find_block(size)
+        if block:
+            row, start = block
+            return self._book_block(row, start, size)
+
+        seats = []
+        anchor = None
+        while len(seats) < size:
+            remaining = size - len(seats)
+            best = None
+            for row in self.rows():
+                length, start = self.longest_block(row, remaining)
+                distance = abs(row - anchor) if anchor is not None else row
+                if length and (best is None or (length, -distance) > (best[0], -best[1])):
+                    best = (length, distance, row, start)
+
+            if best is None:
+                break
+            length, _, row, start = best
+            if anchor is None:
+                anchor = row
+            seats.extend(self._book_block(row, start, length))
+
+        return seats
+
+    def _book_block(self, row, start, length):
+        seats = [(row, seat_number) for seat_number in range(start, start + length)]
+        for seat_number in range(start, start + length):
+            self.book(row, seat_number)
+        return seats
+
+    def first_free(self):
+        for row in self.rows():
+            mask = self.free_mask(row)
+            if mask:
+                # isolate the lowest set bit to get the smallest free seat number
+                return row, (mask & -mask).bit_length()
+        return None, None
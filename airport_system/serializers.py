@@ -1,8 +1,12 @@
-from django.db import transaction
+import time
+from collections import Counter
+
+from django.db import transaction, IntegrityError, OperationalError
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field, extend_schema_serializer, OpenApiExample
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.fields import empty
 
 
 from .models import (
@@ -16,8 +20,12 @@ from .models import (
     Route,
     Flight,
     Order,
-    Ticket, Seat, AirlineRating, Crew,
+    Ticket, Seat, AirlineRating, Crew, AirlineRatingAggregate, AirlineRatingDailyBucket,
+    DistanceJob,
 )
+from . import distance_jobs
+from .distances import route_distances
+from .seat_holds import get_seat_hold_backend
 
 
 class CountrySerializer(serializers.ModelSerializer):
@@ -29,7 +37,7 @@ class CountrySerializer(serializers.ModelSerializer):
 class CitySerializer(serializers.ModelSerializer):
     class Meta:
         model = City
-        fields = ("id", "name", "country")
+        fields = ("id", "name", "country", "latitude", "longitude")
 
 
 class CityListSerializer(CitySerializer):
@@ -41,22 +49,79 @@ class AirportSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Airport
-        fields = ("id", "name", "closest_big_city", "iata_code", "timezone")
+        fields = ("id", "name", "closest_big_city", "iata_code", "timezone", "latitude", "longitude")
 
 
 class AirportListSerializer(AirportSerializer):
     closest_big_city = serializers.SlugRelatedField(slug_field="name", read_only=True)
 
 
+class NearbyAirportSerializer(AirportListSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Airport
+        fields = ("id", "name", "closest_big_city", "iata_code", "latitude", "longitude", "distance_km")
+
+
+class AutocompleteSuggestionSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=["airport", "city"])
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    iata_code = serializers.CharField(allow_null=True)
+    city = serializers.CharField()
+    country = serializers.CharField()
+
+
+class RouteBulkCreateSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        routes = [Route(**route_data) for route_data in validated_data]
+
+        # the airports of all the routes with their cities in one query, for the distance pass
+        airports = Airport.objects.select_related("closest_big_city").in_bulk(
+            {route.source_id for route in routes} | {route.standard_destination_id for route in routes}
+        )
+        for route in routes:
+            route.source = airports[route.source_id]
+            route.standard_destination = airports[route.standard_destination_id]
+
+        missing = [route for route in routes if not route.distance]
+        for route, distance in zip(missing, route_distances(missing)):
+            route.distance = distance
+
+        pending = []
+        if distance_jobs.is_enabled():
+            pending = [route for route in missing if route.distance == -1]
+            for route in pending:
+                route.distance = None
+
+        with transaction.atomic():
+            routes = Route.objects.bulk_create(routes)
+            # the jobs Route.save() would have queued, the routes are new so none exists yet
+            DistanceJob.objects.bulk_create([DistanceJob(route=route) for route in pending])
+        # new routes have no flights yet, the flight graph has nothing to hear about
+        return routes
+
+
 class RouteSerializer(serializers.ModelSerializer):
     def validate(self, data):
-        if data.get('status') is 'emergency' and data.get('emergent_destination') is None:
-            raise serializers.ValidationError("Must update emergent_destination if changing status to emergency")
+        def current(field):
+            return data.get(field, getattr(self.instance, field, None))
+
+        if current('status') == 'emergency' and current('emergent_destination') is None:
+            # divert to the airport nearest to the middle of the route
+            alternates = Route(
+                source=current('source'), standard_destination=current('standard_destination')
+            ).alternate_airports(k=1)
+            if not alternates:
+                raise serializers.ValidationError("Must update emergent_destination if changing status to emergency")
+            data['emergent_destination'] = alternates[0][0]
         return data
 
     class Meta:
         model = Route
         fields = ("id", "source", "standard_destination", "emergent_destination", "distance", 'status')
+        list_serializer_class = RouteBulkCreateSerializer
 
 
 class RouteListSerializer(RouteSerializer):
@@ -136,6 +201,31 @@ class AirplaneListSerializer(AirplaneSerializer):
     airplane_type = serializers.SlugRelatedField(slug_field="name", read_only=True)
 
 
+SEAT_BATCH_SIZE = 1000
+
+
+class AirplaneBulkCreateSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        distributions = []
+        airplanes = []
+
+        for airplane_data in validated_data:
+            row_seats_distribution = self.child.pop_row_seats_distribution(airplane_data)
+            distributions.append(row_seats_distribution)
+            airplanes.append(Airplane(seat_layout=Airplane.layout_from_distribution(row_seats_distribution), **airplane_data))
+
+        with transaction.atomic():
+            airplanes = Airplane.objects.bulk_create(airplanes)
+            seats = [
+                seat
+                for airplane, row_seats_distribution in zip(airplanes, distributions)
+                for seat in airplane.build_seats(row_seats_distribution)
+            ]
+            Seat.objects.bulk_create(seats, batch_size=SEAT_BATCH_SIZE)
+
+        return airplanes
+
+
 @extend_schema_serializer(
     examples=[
         OpenApiExample(
@@ -163,6 +253,7 @@ class AirplaneCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Airplane
         fields = ['id', 'name', 'airline', 'airplane_type', "total_rows",  "total_seats", "row_seats_distribution"]
+        list_serializer_class = AirplaneBulkCreateSerializer
 
     def validate(self, attrs):
         data = super(AirplaneCreateSerializer, self).validate(attrs=attrs)
@@ -185,75 +276,34 @@ class AirplaneCreateSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
+        row_seats_distribution = self.pop_row_seats_distribution(validated_data)
+        validated_data["seat_layout"] = Airplane.layout_from_distribution(row_seats_distribution)
 
-        total_rows = validated_data.pop('total_rows', None)
-
-        # @extend_schema_field({
-        #     "name": "total_rows",
-        #     "description": "Total number of rows for standard airplane (with the same number of seats in each single"
-        #                    "row",
-        #     "type": "integer",
-        #     "format": "int32"
-        # })
+        with transaction.atomic():
+            airplane_instance = super().create(validated_data)
+            self._create_seats(airplane_instance, row_seats_distribution)
 
+        return airplane_instance
 
+    @staticmethod
+    def pop_row_seats_distribution(validated_data):
+        # Standard configuration is a custom one with equal rows
+        total_rows = validated_data.pop('total_rows', None)
         total_seats = validated_data.pop('total_seats', None)
-
-
-        # @extend_schema_field({
-        #     "name": "total_seats",
-        #     "description": "Total number of seats for standard airplane (with the same number of seats in each single"
-        #                    "row",
-        #     "type": "integer",
-        #     "format": "int32"
-        # })
-
         row_seats_distribution = validated_data.pop('row_seats_distribution', None)
 
-        # @extend_schema_field({
-        #     "name": "row_seats_distribution",
-        #     "description": "Distribution of seats for each single row in case when custom airplane is being created"
-        #                    "Reflected as list with integers where value means number of seats and position of integer"
-        #                    "means number of row for which number of seats is distributed",
-        #     "type": "list of dictionaries",
-        #     "format": "int32"
-        # })
-
-        airplane_instance = super().create(validated_data)
-
         if total_rows and total_seats:
-            self._create_standard_airplane(airplane_instance, total_rows, total_seats)
-        elif row_seats_distribution:
-            self._create_custom_airplane(airplane_instance, row_seats_distribution)
-        else:
-            raise ValidationError('No seats data provided')
-
-        return airplane_instance
-
-    def _create_standard_airplane(self, airplane, total_rows, total_seats):
+            return [total_seats // total_rows] * total_rows
+        if row_seats_distribution:
+            return row_seats_distribution
 
-        seats_per_row = total_seats // total_rows
-        for row in range(1, total_rows + 1):
-            for seat_num in range(1, seats_per_row + 1):
-                Seat.objects.create(
-                    airplane=airplane,
-                    row=row,
-                    seat_number=seat_num
-                )
-
-        # создание самолета с одинаковыми рядами
+        raise ValidationError('No seats data provided')
 
-    def _create_custom_airplane(self, airplane, row_seats_distribution):
-
-        for index, seats in enumerate(row_seats_distribution):
-            for seat_num in range(1, seats + 1):
-                seat = Seat.objects.create(
-                    airplane=airplane,
-                    row=index + 1,
-                    seat_number=seat_num,
-                )
-
-                print(f"Создано место: {seat}")
+    def _create_seats(self, airplane, row_seats_distribution):
+        Seat.objects.bulk_create(
+            airplane.build_seats(row_seats_distribution),
+            batch_size=SEAT_BATCH_SIZE
+        )
 
 
 class AirlineSerializer(serializers.ModelSerializer):
@@ -267,23 +317,34 @@ class AirlineSerializer(serializers.ModelSerializer):
     avg_entertainment = serializers.SerializerMethodField(read_only=True)
     avg_wi_fi = serializers.SerializerMethodField(read_only=True)
 
+    def get_rating(self, obj):
+        # rating_period comes from the view, the breakdown is computed once per airline
+        period = self.context.get("rating_period")
+        if not period:
+            return obj.overall_rating
+
+        recent_ratings = self.context.setdefault("recent_ratings", {})
+        if obj.pk not in recent_ratings:
+            recent_ratings[obj.pk] = obj.recent_rating(**period)
+        return recent_ratings[obj.pk]
+
     def get_overall_rating(self, obj):
-        return obj.overall_rating.get('overall_rating', 0)
+        return self.get_rating(obj).get('overall_rating', 0)
 
     def get_avg_boarding_deplaining(self, obj):
-        return obj.overall_rating.get('avg_boarding_deplaining', 0)
+        return self.get_rating(obj).get('avg_boarding_deplaining', 0)
 
     def get_avg_crew(self, obj):
-        return obj.overall_rating.get('avg_crew', 0)
+        return self.get_rating(obj).get('avg_crew', 0)
 
     def get_avg_services(self, obj):
-        return obj.overall_rating.get('avg_services', 0)
+        return self.get_rating(obj).get('avg_services', 0)
 
     def get_avg_entertainment(self, obj):
-        return obj.overall_rating.get('avg_entertainment', 0)
+        return self.get_rating(obj).get('avg_entertainment', 0)
 
     def get_avg_wi_fi(self, obj):
-        return obj.overall_rating.get('avg_wi_fi', 0)
+        return self.get_rating(obj).get('avg_wi_fi', 0)
 
     def create(self, validated_data):
         if 'airplanes' in validated_data:
@@ -354,6 +415,103 @@ class RatingSerializer(serializers.ModelSerializer):
         )
 
 
+class AirlineLeaderboardSerializer(serializers.ModelSerializer):
+    rank = serializers.IntegerField(read_only=True, allow_null=True)
+    id = serializers.IntegerField(source="airline_id", read_only=True)
+    name = serializers.CharField(source="airline.name", read_only=True)
+    overall_rating = serializers.FloatField(source="overall_score", read_only=True)
+
+    class Meta:
+        model = AirlineRatingAggregate
+        fields = ("rank", "id", "name", "overall_rating", "ratings_count")
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for category, average in instance.averages().items():
+            data[category] = average or 0
+        return data
+
+
+RATING_BATCH_SIZE = 500
+
+
+class RatingIngestSerializer(serializers.ModelSerializer):
+    """One record of a bulk rating feed.
+
+    The airline is given by name and resolved by ingest() for a whole chunk at once.
+    """
+
+    airline_name = serializers.CharField(max_length=255)
+
+    class Meta:
+        model = AirlineRating
+        fields = (
+            'airline_name',
+            'boarding_deplaining_rating',
+            'crew_rating',
+            'services_rating',
+            'entertainment_rating',
+            'wi_fi_rating',
+        )
+
+    @classmethod
+    def ingest(cls, records, batch_size=RATING_BATCH_SIZE, position="index"):
+        """Validate and insert (position, record) pairs chunk by chunk.
+
+        Invalid records are skipped and reported by their position in the feed,
+        under the position key and in feed order, returns (created count, errors).
+        """
+        airline_ids = {}
+        created = 0
+        errors = []
+
+        chunk = []
+        for index, record in records:
+            chunk.append((index, record))
+            if len(chunk) == batch_size:
+                created += cls._ingest_chunk(chunk, airline_ids, errors, position)
+                chunk = []
+        if chunk:
+            created += cls._ingest_chunk(chunk, airline_ids, errors, position)
+
+        # unknown airlines are only found after the field errors of their chunk
+        errors.sort(key=lambda error: error[position])
+        return created, errors
+
+    @classmethod
+    def _ingest_chunk(cls, chunk, airline_ids, errors, position):
+        valid = []
+        for index, record in chunk:
+            if isinstance(record, Exception):
+                errors.append({position: index, "errors": {"non_field_errors": [str(record)]}})
+                continue
+            serializer = cls(data=record)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({position: index, "errors": serializer.errors})
+
+        # one lookup for the names this feed did not mention before
+        unknown = {data["airline_name"] for _, data in valid} - airline_ids.keys()
+        if unknown:
+            for airline_id, name in Airline.objects.filter(name__in=unknown).order_by("pk").values_list("id", "name"):
+                airline_ids.setdefault(name, airline_id)
+
+        ratings = []
+        for index, data in valid:
+            name = data.pop("airline_name")
+            if name not in airline_ids:
+                errors.append({position: index, "errors": {"airline_name": [f"Airline '{name}' does not exist."]}})
+                continue
+            ratings.append(AirlineRating(airline_id=airline_ids[name], **data))
+
+        with transaction.atomic():
+            AirlineRating.objects.bulk_create(ratings)
+            AirlineRatingAggregate.add_ratings(ratings)
+            AirlineRatingDailyBucket.add_ratings(ratings)
+        return len(ratings)
+
+
 class AirplaneImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Airplane
@@ -369,6 +527,7 @@ class FlightSerializer(serializers.ModelSerializer):
     class Meta:
         model = Flight
         fields = '__all__'
+        read_only_fields = ("seats_total", "seats_sold")
 
 
 class FlightListSerializer(FlightSerializer, serializers.ModelSerializer):
@@ -407,15 +566,21 @@ class TicketSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         data = super().validate(attrs)
 
+        # Tickets of an order are validated together by OrderSerializer
+        if isinstance(self.root, OrderSerializer):
+            return data
+
         row = attrs["row"]
         seat = attrs["seat"]
         flight = attrs["flight"]
 
+        request = self.context.get("request")
         Ticket.validate_ticket(
             row,
             seat,
             flight,
-            ValidationError
+            ValidationError,
+            user_id=request.user.pk if request else None,
         )
 
         return data
@@ -424,7 +589,8 @@ class TicketSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ticket
-        fields = ("id", "row", "seat", "flight", "type", "allocated")
+        fields = ("id", "row", "seat", "flight", "type", "allocated", "released")
+        read_only_fields = ("released",)
 
 
 class TicketListSerializer(TicketSerializer):
@@ -437,10 +603,27 @@ class TicketSeatsSerializer(TicketSerializer):
         fields = ("row", "seat")
 
 
+class ItinerarySerializer(serializers.Serializer):
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    connections = serializers.IntegerField()
+    flights = FlightListSerializer(many=True)
+
+
 class FlightDetailSerializer(serializers.ModelSerializer):
     route = RouteDetailSerializer(read_only=True)
     airplane = AirplaneSerializer(read_only=True)
-    taken_places = TicketSeatsSerializer(source="tickets", many=True, read_only=True)
+    taken_places = serializers.SerializerMethodField(read_only=True)
+    held_places = serializers.SerializerMethodField(read_only=True)
+
+    def get_taken_places(self, obj):
+        return TicketSeatsSerializer(obj.tickets.filter(released=False), many=True).data
+
+    def get_held_places(self, obj):
+        return [
+            {"row": row, "seat": seat}
+            for row, seat in sorted(get_seat_hold_backend().active_holds(obj.pk))
+        ]
 
     class Meta:
         model = Flight
@@ -452,9 +635,50 @@ class FlightDetailSerializer(serializers.ModelSerializer):
             "estimated_arrival_time",
             "real_arrival_time",
             "taken_places",
+            "held_places",
         )
 
 
+class SeatHoldSerializer(serializers.Serializer):
+    row = serializers.IntegerField()
+    seat = serializers.IntegerField()
+    expires_at = serializers.DateTimeField(read_only=True)
+
+    def validate(self, attrs):
+        flight = self.context["flight"]
+        row = attrs["row"]
+        seat = attrs["seat"]
+
+        layout_error = Ticket.get_layout_error(row, seat, flight.airplane)
+        if layout_error:
+            raise ValidationError(layout_error)
+
+        if self.context.get("check_taken", True) and flight.tickets.filter(
+            row=row, seat=seat, released=False
+        ).exists():
+            raise ValidationError(Ticket.get_taken_error(row, seat))
+
+        return attrs
+
+
+ORDER_CREATE_ATTEMPTS = 3
+ORDER_RETRY_DELAY = 0.05
+ORDER_CONFLICT_MESSAGE = "The order conflicted with concurrent bookings, please try again."
+# PostgreSQL SQLSTATEs of a lost race: unique violation, serialization failure, deadlock, lock not available
+CONFLICT_SQLSTATES = {"23505", "40001", "40P01", "55P03"}
+CONFLICT_SQLITE_MESSAGES = ("database is locked", "database table is locked", "UNIQUE constraint failed")
+
+
+def is_booking_conflict(exc):
+    """Whether a database error comes from a concurrent booking rather than an outage or a bug."""
+    cause = exc.__cause__
+    # psycopg2 names it pgcode, psycopg 3 sqlstate
+    sqlstate = getattr(cause, "pgcode", None) or getattr(cause, "sqlstate", None)
+    if sqlstate is not None:
+        return sqlstate in CONFLICT_SQLSTATES
+    return any(message in str(exc) for message in CONFLICT_SQLITE_MESSAGES)
+
+
 class OrderSerializer(serializers.ModelSerializer):
     tickets = TicketSerializer(many=True, read_only=False, allow_null=False)
 
@@ -463,19 +687,85 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ("id", "tickets", "created_at")
 
     def create(self, validated_data):
-        with transaction.atomic():
-            tickets_data = validated_data.pop("tickets")
-            # Get flight instance
-            flight = tickets_data[0]['flight']
-            tickets_available = flight.tickets_available
+        tickets_data = validated_data.pop("tickets")
+
+        # A concurrent booking can still break the unique seat constraint or deadlock
+        # the database, retry the whole order a few times before giving up
+        for attempt in range(1, ORDER_CREATE_ATTEMPTS + 1):
+            try:
+                return self._create_order(validated_data, tickets_data)
+            except (IntegrityError, OperationalError) as exc:
+                if not is_booking_conflict(exc):
+                    raise
+                if attempt == ORDER_CREATE_ATTEMPTS:
+                    raise ValidationError({"non_field_errors": [ORDER_CONFLICT_MESSAGE]}) from exc
+                time.sleep(ORDER_RETRY_DELAY * attempt)
+
+    def run_validation(self, data=empty):
+        # the flight lookups of the nested tickets may hit a locked database too
+        try:
+            return super().run_validation(data)
+        except OperationalError as exc:
+            if not is_booking_conflict(exc):
+                raise
+            raise ValidationError({"non_field_errors": [ORDER_CONFLICT_MESSAGE]}) from exc
 
-            if tickets_available < len(tickets_data):
-                raise serializers.ValidationError("Not enough tickets available")
+    def validate(self, attrs):
+        data = super().validate(attrs)
 
-            order = Order.objects.create(**validated_data)
+        request = self.context.get("request")
+        user_id = request.user.pk if request else None
+        self._raise_ticket_errors(Ticket.validate_tickets(attrs["tickets"], user_id=user_id))
+
+        return data
+
+    @staticmethod
+    def _raise_ticket_errors(errors):
+        if any(errors):
+            raise ValidationError({
+                "tickets": [{field: [message] for field, message in error.items()} for error in errors]
+            })
 
-            for ticket_data in tickets_data:
-                Ticket.objects.create(order=order, **ticket_data)
+    @staticmethod
+    def _create_order(validated_data, tickets_data):
+        with transaction.atomic():
+            tickets_per_flight = Counter(ticket_data["flight"].pk for ticket_data in tickets_data)
+
+            # Lock the inventory of every flight in the order, always in pk order
+            flights = (
+                Flight.objects.select_for_update(of=("self",))
+                .select_related("airplane")
+                .filter(pk__in=tickets_per_flight)
+                .order_by("pk")
+            )
+            for flight in flights:
+                if flight.tickets_available < tickets_per_flight[flight.pk]:
+                    raise serializers.ValidationError("Not enough tickets available")
+
+            # Seats may have been taken since validate(), check again under the lock
+            user_id = validated_data["user"].pk
+            OrderSerializer._raise_ticket_errors(Ticket.validate_tickets(
+                tickets_data,
+                seat_maps={flight.pk: flight.seat_map(user_id) for flight in flights},
+                user_id=user_id,
+            ))
+
+            order = Order.objects.create(**validated_data)
+            # bulk_create() sends no post_save, the counters are updated here
+            tickets = Ticket.objects.bulk_create(
+                [Ticket(order=order, **ticket_data) for ticket_data in tickets_data]
+            )
+            for flight_id, tickets_count in tickets_per_flight.items():
+                Flight.add_sold_seats(flight_id, tickets_count)
+
+            # The booked seats don't need the user's holds anymore
+            backend = get_seat_hold_backend()
+            for flight_id in tickets_per_flight:
+                backend.release(
+                    flight_id,
+                    [(ticket.row, ticket.seat) for ticket in tickets if ticket.flight_id == flight_id],
+                    user_id,
+                )
 
             return order
 
@@ -0,0 +1,81 @@
+"""Denormalized data kept on signals, so cascades and QuerySet.delete() keep it too.
+
+Model save() and delete() overrides are skipped by cascade deletes and
+queryset deletes, post_save and post_delete are sent for every row.
+bulk_create() still sends nothing, its callers update the counters and
+the rating totals.
+
+The flight graph is only patched once the transaction commits, a rolled
+back change never reaches it.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from airport_system import route_graph
+from airport_system.models import (
+    AirlineRating, AirlineRatingAggregate, AirlineRatingDailyBucket, Flight, Route, Ticket
+)
+
+
+@receiver(post_save, sender=Ticket)
+def count_sold_ticket(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not instance.released:
+        Flight.add_sold_seats(instance.flight_id, 1)
+
+
+@receiver(post_delete, sender=Ticket)
+def uncount_deleted_ticket(sender, instance, **kwargs):
+    # released tickets were uncounted when their order was canceled
+    if not instance.released:
+        Flight.add_sold_seats(instance.flight_id, -1)
+
+
+@receiver(pre_save, sender=AirlineRating)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    instance._previous_rating = None
+    if not raw and not instance._state.adding:
+        instance._previous_rating = AirlineRating.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=AirlineRating)
+def count_saved_rating(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous_rating", None)
+    for totals in (AirlineRatingAggregate, AirlineRatingDailyBucket):
+        if previous is not None:
+            totals.add_ratings([previous], -1)
+        totals.add_ratings([instance])
+
+
+@receiver(post_delete, sender=AirlineRating)
+def uncount_deleted_rating(sender, instance, **kwargs):
+    for totals in (AirlineRatingAggregate, AirlineRatingDailyBucket):
+        totals.add_ratings([instance], -1)
+
+
+@receiver(post_save, sender=Flight)
+def update_graph_flight(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        flight_id = instance.pk
+        transaction.on_commit(lambda: route_graph.flight_saved(flight_id), using=using)
+
+
+@receiver(post_delete, sender=Flight)
+def remove_graph_flight(sender, instance, using=None, **kwargs):
+    flight_id = instance.pk
+    transaction.on_commit(lambda: route_graph.flight_deleted(flight_id), using=using)
+
+
+@receiver(post_save, sender=Route)
+def update_graph_route(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        route_id, source_id, destination_id = instance.pk, instance.source_id, instance.standard_destination_id
+        transaction.on_commit(lambda: route_graph.route_saved(route_id, source_id, destination_id), using=using)
+
+
+@receiver(post_delete, sender=Route)
+def remove_graph_route(sender, instance, using=None, **kwargs):
+    route_id = instance.pk
+    transaction.on_commit(lambda: route_graph.route_deleted(route_id), using=using)
@@ -1,18 +1,28 @@
+from datetime import timedelta
+import json
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from airport_system.models import (
-    Airline, Flight, Airplane, AirplaneType, Airport, Route, Seat, AirlineRating, Country, City
+    Airline, Flight, Airplane, AirplaneType, Airport, Route, Seat, AirlineRating, Country, City,
+    AirlineRatingAggregate, AirlineRatingDailyBucket
 )
-from airport_system.serializers import AirlineListSerializer
+from airport_system.serializers import AirlineListSerializer, AirlineSerializer
 
 AIRLINE_URL = reverse("airport_system:airline-list")
 AIRLINE_RATING_URL = reverse("airport_system:airlinerating-list")
+AIRLINE_RATING_BULK_URL = reverse("airport_system:airlinerating-bulk-ingest")
 FLIGHT_URL = reverse("airport_system:flight-list")
 
 
@@ -312,3 +322,188 @@ class AdminAirlineApiTests(TestCase):
         self.assertNotEqual(avg_entertainment_old, avg_entertainment_new)
         self.assertNotEqual(avg_wi_fi_old, avg_wi_fi_new)
         self.assertNotEqual(overall_rating_old, overall_rating_new)
+
+    def test_rating_aggregate_is_updated_incrementally(self):
+        airline = Airline.objects.create(name="Test airline 8")
+        payload = {
+            "airline_name": airline.name,
+            "boarding_deplaining_rating": 4,
+            "crew_rating": 5,
+            "services_rating": 3,
+            "entertainment_rating": 4,
+            "wi_fi_rating": 2,
+        }
+        self.client.post(AIRLINE_RATING_URL, payload)
+        self.client.post(AIRLINE_RATING_URL, {**payload, "crew_rating": 3, "wi_fi_rating": 4})
+
+        aggregate = AirlineRatingAggregate.objects.get(airline=airline)
+        self.assertEqual(aggregate.ratings_count, 2)
+        self.assertEqual((aggregate.crew_sum, aggregate.crew_count), (8, 2))
+
+        airline = Airline.objects.select_related("rating_aggregate").get(pk=airline.pk)
+        with self.assertNumQueries(0):
+            averages = airline.overall_rating
+        self.assertEqual(averages["avg_crew"], 4)
+        self.assertEqual(averages["avg_wi_fi"], 3)
+
+        AirlineRating.objects.filter(airline=airline).first().delete()
+        aggregate.refresh_from_db()
+        self.assertEqual(aggregate.ratings_count, 1)
+
+    def test_rating_totals_follow_queryset_and_cascade_deletes(self):
+        airline = Airline.objects.create(name="Test airline 10")
+        for crew_rating in (1, 4, 5):
+            AirlineRating.objects.create(airline=airline, crew_rating=crew_rating)
+
+        rating = AirlineRating.objects.get(airline=airline, crew_rating=4)
+        rating.crew_rating = 2
+        rating.save()
+        AirlineRating.objects.filter(airline=airline, crew_rating=1).delete()
+
+        aggregate = AirlineRatingAggregate.objects.get(airline=airline)
+        self.assertEqual((aggregate.ratings_count, aggregate.crew_sum), (2, 7))
+        self.assertEqual(AirlineRatingDailyBucket.objects.get(airline=airline).crew_sum, 7)
+
+        airline.delete()
+        self.assertFalse(AirlineRatingAggregate.objects.exists())
+        self.assertFalse(AirlineRatingDailyBucket.objects.exists())
+
+    def test_rebuild_rating_aggregates(self):
+        airline = Airline.objects.create(name="Test airline 9")
+        AirlineRating.objects.create(airline=airline, crew_rating=5, wi_fi_rating=None)
+        AirlineRating.objects.create(airline=airline, crew_rating=2, wi_fi_rating=3)
+        AirlineRatingAggregate.objects.all().delete()
+
+        call_command("rebuild_rating_aggregates", stdout=StringIO())
+
+        aggregate = AirlineRatingAggregate.objects.get(airline=airline)
+        self.assertEqual(aggregate.ratings_count, 2)
+        self.assertEqual((aggregate.crew_sum, aggregate.crew_count), (7, 2))
+        self.assertEqual((aggregate.wi_fi_sum, aggregate.wi_fi_count), (3, 1))
+
+    def test_rating_breakdown_loaded_once_per_listing(self):
+        for index in range(3):
+            airline = Airline.objects.create(name=f"Rated airline {index}")
+            AirlineRating.objects.create(airline=airline, crew_rating=index + 1, services_rating=3)
+
+        airlines = Airline.objects.filter(name__startswith="Rated").select_related("rating_aggregate")
+        with CaptureQueriesContext(connection) as context:
+            data = AirlineSerializer(airlines, many=True).data
+
+        aggregate_queries = [
+            query for query in context.captured_queries
+            if "airlineratingaggregate" in query["sql"] or "AVG(" in query["sql"]
+        ]
+        self.assertEqual(len(aggregate_queries), 1)
+        self.assertEqual([airline["avg_crew"] for airline in data], [1, 2, 3])
+        self.assertEqual({airline["avg_services"] for airline in data}, {3})
+
+    def test_windowed_and_decayed_ratings(self):
+        airline = Airline.objects.create(name="Test airline 10")
+        old_rating = AirlineRating.objects.create(airline=airline, crew_rating=1, services_rating=1)
+        AirlineRating.objects.create(airline=airline, crew_rating=5, services_rating=3)
+        self.assertEqual(AirlineRatingDailyBucket.objects.get(airline=airline).ratings_count, 2)
+
+        AirlineRating.objects.filter(pk=old_rating.pk).update(created_time=timezone.now() - timedelta(days=40))
+        call_command("rebuild_rating_aggregates", airline_ids=[airline.pk], stdout=StringIO())
+
+        url = reverse("airport_system:airline-detail", kwargs={"pk": airline.id})
+        self.assertEqual(self.client.get(url).data["avg_crew"], 3)
+
+        res = self.client.get(url, {"window_days": 30})
+        self.assertEqual(res.data["avg_crew"], 5)
+        self.assertEqual(res.data["avg_services"], 3)
+        self.assertEqual(res.data["avg_wi_fi"], 0)
+
+        res = self.client.get(url, {"half_life_days": 40})
+        self.assertAlmostEqual(res.data["avg_crew"], (5 + 0.5) / 1.5)
+
+        res = self.client.get(url, {"window_days": "a month"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(url, {"window_days": AirlineRatingDailyBucket.MAX_PERIOD_DAYS})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        for param in ("window_days", "half_life_days"):
+            res = self.client.get(url, {param: 10 ** 12})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_ingest_ratings(self):
+        airline = Airline.objects.create(name="Test airline 11")
+        record = {
+            "airline_name": airline.name,
+            "boarding_deplaining_rating": 4,
+            "crew_rating": 5,
+            "services_rating": 3,
+            "entertainment_rating": 4,
+            "wi_fi_rating": 2,
+        }
+        payload = [record] * 5 + [{**record, "airline_name": "Unknown"}, {**record, "crew_rating": 7}]
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.post(AIRLINE_RATING_BULK_URL, data=json.dumps(payload), content_type="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 5)
+        self.assertEqual([error["index"] for error in res.data["errors"]], [5, 6])
+        self.assertIn("airline_name", res.data["errors"][0]["errors"])
+        self.assertIn("crew_rating", res.data["errors"][1]["errors"])
+
+        airline_lookups = [query for query in context.captured_queries if 'FROM "airport_system_airline"' in query["sql"]]
+        self.assertEqual(len(airline_lookups), 1)
+        self.assertEqual(AirlineRatingAggregate.objects.get(airline=airline).ratings_count, 5)
+        self.assertEqual(AirlineRatingDailyBucket.objects.get(airline=airline).crew_sum, 25)
+
+    def test_bulk_ingest_rejects_non_list_bodies(self):
+        for body in ("5", "null", '"ratings"', "{}"):
+            res = self.client.post(AIRLINE_RATING_BULK_URL, data=body, content_type="application/json")
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_ingest_ndjson_ratings(self):
+        airline = Airline.objects.create(name="Test airline 12")
+        lines = [
+            json.dumps({"airline_name": airline.name, "crew_rating": 5}),
+            "",
+            "{not json",
+            json.dumps({"airline_name": airline.name, "crew_rating": 3}),
+        ]
+
+        res = self.client.post(
+            AIRLINE_RATING_BULK_URL, data="\n".join(lines), content_type="application/x-ndjson"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 2)
+        # blank lines count, the bad record is on the third line
+        self.assertEqual(res.data["errors"][0]["line"], 3)
+        self.assertEqual(Airline.objects.get(pk=airline.pk).overall_rating["avg_crew"], 4)
+
+    def test_airline_leaderboard(self):
+        scores = {"Leader": (5, 5), "Runner up": (4, 5), "Tied": (4, 5), "Last": (1, 1)}
+        for name, (crew, services) in scores.items():
+            AirlineRating.objects.create(
+                airline=Airline.objects.create(name=name), crew_rating=crew, services_rating=services
+            )
+
+        url = reverse("airport_system:airline-leaderboard")
+        res = self.client.get(url, {"page_size": 2, "page": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 4)
+        self.assertEqual([(row["rank"], row["name"]) for row in res.data["results"]], [(2, "Tied"), (4, "Last")])
+
+        res = self.client.get(url, {"ordering": "avg_services"})
+        self.assertEqual([row["rank"] for row in res.data["results"]], [1, 1, 1, 4])
+        self.assertEqual(self.client.get(url, {"ordering": "legroom"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        AirlineRating.objects.create(airline=Airline.objects.get(name="Tied"), crew_rating=5, services_rating=5)
+
+        res = self.client.get(reverse("airport_system:airline-rank", args=[Airline.objects.get(name="Tied").id]))
+        self.assertEqual(res.data["rank"], 2)
+        res = self.client.get(reverse("airport_system:airline-rank", args=[Airline.objects.get(name="Runner up").id]))
+        self.assertEqual(res.data["rank"], 3)
+
+        unrated = Airline.objects.create(name="Unrated")
+        for pk in (unrated.id, 10 ** 6, "abc"):
+            res = self.client.get(reverse("airport_system:airline-rank", args=[pk]))
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
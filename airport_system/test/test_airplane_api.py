@@ -22,9 +22,11 @@ from airport_system.models import (
     Flight,
     airplane_image_file_path
 )
-from airport_system.serializers import AirplaneListSerializer
+from airport_system.seat_map import SeatMap
+from airport_system.serializers import AirplaneListSerializer, AirplaneSerializer
 
 AIRPLANE_URL = reverse("airport_system:airplane-list")
+AIRPLANE_BULK_URL = reverse("airport_system:airplane-bulk-register")
 
 
 def image_upload_url(airplane_id):
@@ -204,6 +206,39 @@ class AuthenticatedAirportApiTests(TestCase):
             self.assertListEqual(list(res_data["rows_with_seat_count"]), list(serializer_data["rows_with_seat_count"]))
             self.assertEqual(res_data["image"], serializer_data["image"])
 
+    def test_seat_layout_follows_seats(self):
+        airplane = sample_airplane_custom()
+
+        self.assertEqual(airplane.seat_layout, [(1 << seat_row % 5 + 1) - 1 for seat_row in range(1, 21)])
+
+        Seat.objects.get(airplane=airplane, row=20, seat_number=1).delete()
+        airplane.refresh_from_db()
+
+        self.assertEqual(airplane.total_rows, 19)
+        self.assertFalse(airplane.has_row(20))
+
+        with self.assertNumQueries(0):
+            data = AirplaneSerializer(airplane).data
+
+        self.assertEqual(data["total_seats"], sum(seat_row % 5 + 1 for seat_row in range(1, 20)))
+        self.assertIsNone(data["standard_number_seats_in_row"])
+
+    def test_seat_layout_keeps_seats_after_a_deleted_middle_seat(self):
+        airplane = sample_airplane_custom()
+        # row 4 has seats 1 to 5
+        Seat.objects.get(airplane=airplane, row=4, seat_number=2).delete()
+        airplane.refresh_from_db()
+
+        self.assertEqual(airplane.seat_layout[3], 0b11101)
+        self.assertFalse(airplane.has_seat(4, 2))
+        self.assertTrue(airplane.has_seat(4, 5))
+        self.assertEqual(airplane.custom_rows_with_seat_count()[3], {"row": 4, "seat_count": 4})
+
+        seat_map = SeatMap.from_layout(airplane.seat_layout)
+        self.assertFalse(seat_map.has_seat(4, 2))
+        self.assertIn((4, 5), list(seat_map.free_seats()))
+        self.assertNotIn((4, 2), list(seat_map.free_seats()))
+
     def test_create_airplane_forbidden(self):
         airline = Airline.objects.create(name="Test airline")
         airplane_type = AirplaneType.objects.create(
@@ -257,6 +292,59 @@ class AdminAirplaneApiTests(TestCase):
         self.assertEqual(payload["airline"], airplane.airline.id)
         self.assertEqual(payload["airplane_type"], airplane.airplane_type.id)
 
+    def test_bulk_register_airplanes(self):
+        airline = Airline.objects.create(name="Test airline")
+        airplane_type = AirplaneType.objects.create(
+            name="Test type"
+        )
+        payload = [
+            {
+                "name": "Airbus A380",
+                "airline": airline.id,
+                "airplane_type": airplane_type.id,
+                "total_rows": 50,
+                "total_seats": 500
+            },
+            {
+                "name": "Embraer 190",
+                "airline": airline.id,
+                "airplane_type": airplane_type.id,
+                "row_seats_distribution": [2, 4, 4]
+            }
+        ]
+        res = self.client.post(AIRPLANE_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 2)
+        standard = Airplane.objects.get(name="Airbus A380")
+        custom = Airplane.objects.get(name="Embraer 190")
+        self.assertEqual(standard.total_seats, 500)
+        self.assertEqual(standard.total_rows, 50)
+        self.assertEqual(custom.total_seats, 10)
+        self.assertEqual(
+            list(Seat.objects.filter(airplane=custom, row=1).values_list("seat_number", flat=True)),
+            [1, 2]
+        )
+
+    def test_bulk_register_airplanes_invalid_layout(self):
+        airline = Airline.objects.create(name="Test airline")
+        airplane_type = AirplaneType.objects.create(
+            name="Test type"
+        )
+        payload = [
+            {
+                "name": "Broken",
+                "airline": airline.id,
+                "airplane_type": airplane_type.id,
+                "total_rows": 7,
+                "total_seats": 50
+            }
+        ]
+        res = self.client.post(AIRPLANE_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Airplane.objects.filter(name="Broken").exists())
+
 
 class AirplaneImageUploadTests(TestCase):
     def setUp(self):
@@ -7,9 +7,11 @@ from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from airport_system.models import Airport, Country, City
+from airport_system.name_search import invalidate_autocomplete_index
 from airport_system.serializers import AirportSerializer, AirportListSerializer
 
 AIRPORT_URL = reverse("airport_system:airport-list")
+AUTOCOMPLETE_URL = reverse("airport_system:airport-autocomplete")
 
 
 def sample_airport(**kwargs):
@@ -138,3 +140,51 @@ class AdminAirportApiTests(TestCase):
         self.assertEqual(payload["timezone"], airport.timezone)
         # ISSUE WITH COMPARISON
         # self.assertEqual(payload["id"], airport.id)
+
+
+class AirportAutocompleteApiTests(TestCase):
+    def setUp(self):
+        invalidate_autocomplete_index()
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user("test@gmail.com", "test password"))
+
+        germany = Country.objects.create(name="Germany")
+        self.berlin = City.objects.create(name="Berlin", country=germany)
+        self.bern = City.objects.create(name="Bern", country=Country.objects.create(name="Switzerland"))
+        self.brandenburg = sample_airport(name="Berlin Brandenburg Airport", iata_code="BER", closest_big_city=self.berlin)
+        self.tegel = sample_airport(name="Tegel Airport", iata_code="TXL", closest_big_city=self.berlin)
+
+    def _suggestions(self, **params):
+        res = self.client.get(AUTOCOMPLETE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(suggestion["type"], suggestion["id"]) for suggestion in res.data]
+
+    def test_iata_code_first_then_airports_then_shorter_names(self):
+        self.assertEqual(
+            self._suggestions(q="ber"),
+            [
+                ("airport", self.brandenburg.id),
+                ("city", self.bern.id),
+                ("city", self.berlin.id),
+            ],
+        )
+        self.assertEqual(self._suggestions(q="BERL"), [("airport", self.brandenburg.id), ("city", self.berlin.id)])
+
+    def test_words_inside_names_type_and_limit(self):
+        self.assertEqual(self._suggestions(q="brand"), [("airport", self.brandenburg.id)])
+        self.assertEqual(self._suggestions(q="txl")[0], ("airport", self.tegel.id))
+        self.assertEqual(self._suggestions(q="ber", type="city"), [("city", self.bern.id), ("city", self.berlin.id)])
+        self.assertEqual(len(self._suggestions(q="ber", limit=1)), 1)
+        self.assertEqual(self._suggestions(q=""), [])
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "ber", "limit": 100})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self._suggestions(q="zur"), [])
+
+        zurich = City.objects.create(name="Zürich", country=self.bern.country)
+        self.tegel.name = "Zurich Tegel"
+        self.tegel.save()
+
+        self.assertEqual(self._suggestions(q="zur"), [("airport", self.tegel.id), ("city", zurich.id)])
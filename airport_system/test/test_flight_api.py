@@ -1,8 +1,13 @@
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from io import StringIO
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -22,15 +27,21 @@ from airport_system.models import (
     City,
     Country,
 )
+from airport_system.route_graph import FlightGraph, get_flight_graph, invalidate_flight_graph
 from airport_system.serializers import FlightDetailSerializer, FlightListSerializer
 
 FLIGHT_URL = reverse("airport_system:flight-list")
+ITINERARY_URL = reverse("airport_system:flight-itineraries")
 
 
 def detail_url(flight_id):
     return reverse("airport_system:flight-detail", args=[flight_id])
 
 
+def allocate_seats_url(flight_id):
+    return reverse("airport_system:flight-allocate-seats", args=[flight_id])
+
+
 class UnauthenticatedFlightApiTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -136,7 +147,7 @@ class UnauthenticatedFlightApiTests(TestCase):
 
     def test_list_flights(self):
         res = self.client.get(FLIGHT_URL)
-        flights = Flight.objects.all()
+        flights = Flight.objects.order_by("departure_time", "id")
         serializer = FlightListSerializer(flights, many=True)
 
         for flight, serialized_flight in zip(flights, serializer.data):
@@ -145,7 +156,7 @@ class UnauthenticatedFlightApiTests(TestCase):
             serialized_flight["tickets_available"] = tickets_available
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertListEqual(list(res.data), list(serializer.data))
+        self.assertListEqual(list(res.data["results"]), list(serializer.data))
 
     def test_filter_flights_by_source_exist(self):
         aim_source = self.flight_1.route.source
@@ -165,8 +176,8 @@ class UnauthenticatedFlightApiTests(TestCase):
 
         res = self.client.get(FLIGHT_URL, {"airport_from": aim_source.name})
 
-        self.assertEqual(len(res.data), 2)
-        for flight in res.data:
+        self.assertEqual(len(res.data["results"]), 2)
+        for flight in res.data["results"]:
             self.assertEqual(flight["route_source"], str(aim_source))
 
     def test_filter_flights_by_source_absent(self):
@@ -174,7 +185,7 @@ class UnauthenticatedFlightApiTests(TestCase):
 
         res = self.client.get(FLIGHT_URL, {"airport_from": aim_source_name})
 
-        self.assertEqual(len(res.data), 0)
+        self.assertEqual(len(res.data["results"]), 0)
 
     def test_filter_flights_by_destination_exist(self):
         aim_destination = self.flight_2.route.standard_destination
@@ -193,8 +204,8 @@ class UnauthenticatedFlightApiTests(TestCase):
 
         res = self.client.get(FLIGHT_URL, {"airport_to": aim_destination.name})
 
-        self.assertEqual(len(res.data), 2)
-        for flight in res.data:
+        self.assertEqual(len(res.data["results"]), 2)
+        for flight in res.data["results"]:
             self.assertEqual(flight["route_standard_destination"], str(aim_destination))
 
     def test_filter_flights_by_destination_absent(self):
@@ -202,7 +213,7 @@ class UnauthenticatedFlightApiTests(TestCase):
 
         res = self.client.get(FLIGHT_URL, {"airport_to": aim_destination_name})
 
-        self.assertEqual(len(res.data), 0)
+        self.assertEqual(len(res.data["results"]), 0)
 
     def test_tickets_available_if_several_tickets_ordered(self):
         # CONSIDER DO YOU REALLY NEED THIS USER OR JUST TAKE USER FROM SET UP FILE - self.user
@@ -222,7 +233,7 @@ class UnauthenticatedFlightApiTests(TestCase):
 
         tickets_available = self.flight_1.airplane.total_seats
         self.assertEqual(
-            res.data[0]["tickets_available"], tickets_available - tickets_ordered
+            res.data["results"][0]["tickets_available"], tickets_available - tickets_ordered
         )
 
     def test_tickets_available_if_all_tickets_ordered(self):
@@ -241,7 +252,65 @@ class UnauthenticatedFlightApiTests(TestCase):
 
         res = self.client.get(FLIGHT_URL)
 
-        self.assertEqual(res.data[0]["tickets_available"], 0)
+        self.assertEqual(res.data["results"][0]["tickets_available"], 0)
+
+    def test_list_flights_query_count_does_not_grow_with_flights(self):
+        with CaptureQueriesContext(connection) as two_flights:
+            self.client.get(FLIGHT_URL)
+
+        for day in range(10, 20):
+            Flight.objects.create(
+                airplane=self.airplane,
+                route=self.route_1,
+                departure_time=f"2022-08-{day} 10:00",
+                estimated_arrival_time=f"2022-08-{day} 18:00"
+            )
+
+        with CaptureQueriesContext(connection) as twelve_flights:
+            res = self.client.get(FLIGHT_URL, {"page_size": 20})
+
+        self.assertEqual(len(res.data["results"]), 12)
+        self.assertEqual(len(two_flights), len(twelve_flights))
+
+    def test_cursor_pages_through_flights_sharing_a_departure_time(self):
+        for _ in range(5):
+            Flight.objects.create(
+                airplane=self.airplane,
+                route=self.route_1,
+                departure_time="2022-06-10 10:00",
+                estimated_arrival_time="2022-06-10 18:00"
+            )
+        expected = list(Flight.objects.order_by("departure_time", "id").values_list("id", flat=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(FLIGHT_URL, {"page_size": 3})
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+        self.assertIsNone(res.data["previous"])
+
+        seen = [flight["id"] for flight in res.data["results"]]
+        pages = [res]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            pages.append(res)
+            seen += [flight["id"] for flight in res.data["results"]]
+        self.assertEqual(seen, expected)
+
+        res = self.client.get(pages[-1].data["previous"])
+        self.assertEqual(res.data["results"], pages[-2].data["results"])
+
+        res = self.client.get(FLIGHT_URL, {"cursor": "not a cursor"})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reconcile_flight_seats_command(self):
+        order = Order.objects.create(user=get_user_model().objects.create_user("test@gmail.com", "test password"))
+        Ticket.objects.create(flight=self.flight_2, order=order, row=2, seat=2)
+        Flight.objects.filter(pk=self.flight_2.pk).update(seats_total=0, seats_sold=0)
+
+        call_command("reconcile_flight_seats", batch_size=1, stdout=StringIO())
+
+        self.flight_2.refresh_from_db()
+        self.assertEqual(self.flight_2.seats_total, 300)
+        self.assertEqual(self.flight_2.seats_sold, 1)
 
     def test_create_flight_by_not_admin_is_forbidden(self):
         payload = {
@@ -371,3 +440,139 @@ class AdminFlightApiTests(TestCase):
         )
 
         self.assertEqual(payload["route"], flight.route.id)
+
+    def test_allocate_seats_for_whole_flight(self):
+        flight = Flight.objects.create(
+            airplane=self.airplane,
+            route=self.route,
+            departure_time=datetime(2024, 1, 10, 12, 30, 0),
+            estimated_arrival_time=datetime(2024, 1, 10, 14, 30, 0)
+        )
+        order = Order.objects.create(user=self.user)
+        seated = Ticket.objects.create(flight=flight, order=order, row=1, seat=1)
+        for _ in range(20):
+            Ticket.objects.create(flight=flight, order=order)
+
+        res = self.client.post(allocate_seats_url(flight.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {"allocated": 20, "unallocated": 0})
+        seated.refresh_from_db()
+        self.assertEqual((seated.row, seated.seat, seated.type), (1, 1, "completed"))
+        self.assertFalse(flight.tickets.filter(type="check-in-pending").exists())
+        seats = set(flight.tickets.values_list("row", "seat"))
+        self.assertEqual(len(seats), 21)
+        self.assertIn((2, 6), seats)
+
+
+class ItineraryApiTests(TestCase):
+    def setUp(self):
+        invalidate_flight_graph()
+        self.addCleanup(invalidate_flight_graph)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user("test@gmail.com", "test password"))
+
+        self.airplane = Airplane.objects.create(
+            name="Test airplane",
+            airline=Airline.objects.create(name="Test airline"),
+            airplane_type=AirplaneType.objects.create(name="Test type"),
+        )
+        city = City.objects.create(name="Kyiv", country=Country.objects.create(name="Ukraine"))
+        self.airports = {
+            code: Airport.objects.create(name=f"{code} airport", iata_code=code, closest_big_city=city)
+            for code in ("KBP", "WAW", "FRA", "JFK")
+        }
+        self.day = (timezone.now() + timedelta(days=2)).date()
+
+    def _flight(self, source, destination, departure_hour, duration_hours, **kwargs):
+        route, _ = Route.objects.get_or_create(
+            source=self.airports[source], standard_destination=self.airports[destination], defaults={"distance": 1}
+        )
+        departure = timezone.make_aware(datetime.combine(self.day, time(departure_hour)))
+        return Flight.objects.create(
+            airplane=self.airplane,
+            route=route,
+            departure_time=departure,
+            estimated_arrival_time=departure + timedelta(hours=duration_hours),
+            **kwargs
+        )
+
+    def _search(self, **params):
+        return self.client.get(
+            ITINERARY_URL, {"airport_from": "KBP", "airport_to": "JFK", "date": self.day.isoformat(), **params}
+        )
+
+    def test_connections_earliest_arrival_first(self):
+        kyiv_warsaw = self._flight("KBP", "WAW", 6, 2)
+        warsaw_new_york = self._flight("WAW", "JFK", 9, 9)
+        too_short_connection = self._flight("WAW", "JFK", 8, 8)
+        kyiv_frankfurt = self._flight("KBP", "FRA", 7, 3)
+        frankfurt_new_york = self._flight("FRA", "JFK", 12, 9)
+
+        res = self._search()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [[flight["id"] for flight in itinerary["flights"]] for itinerary in res.data],
+            [[kyiv_warsaw.id, warsaw_new_york.id], [kyiv_frankfurt.id, frankfurt_new_york.id]],
+        )
+        self.assertEqual(res.data[0]["connections"], 1)
+        self.assertNotIn(too_short_connection.id, [flight["id"] for flight in res.data[0]["flights"]])
+
+    def test_graph_follows_flight_changes(self):
+        direct = self._flight("KBP", "JFK", 10, 11)
+        self.assertEqual(len(self._search().data), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            direct.status = "failed"
+            direct.save()
+        self.assertEqual(self._search().data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            later = self._flight("KBP", "JFK", 12, 11)
+            later.route.standard_destination = self.airports["FRA"]
+            later.route.save()
+        self.assertEqual(self._search().data, [])
+        self.assertEqual(len(get_flight_graph()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            later.route.delete()
+        self.assertEqual(len(get_flight_graph()), 0)
+
+    def test_graph_ignores_rolled_back_changes(self):
+        self.assertEqual(self._search().data, [])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self._flight("KBP", "JFK", 10, 11)
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(len(get_flight_graph()), 0)
+
+    def test_max_legs_and_bad_parameters(self):
+        self._flight("KBP", "WAW", 6, 2)
+        self._flight("WAW", "JFK", 9, 9)
+
+        self.assertEqual(self._search(max_legs=1).data, [])
+        self.assertEqual(self._search(airport_to="XXX").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._search(date="tomorrow").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._search(k=0).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._search(airport_to="KBP").status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_skips_visited_airports(self):
+        start = timezone.now()
+        graph = FlightGraph([
+            (1, 1, "A", "B", start, start + timedelta(hours=1)),
+            (2, 2, "B", "A", start + timedelta(hours=2), start + timedelta(hours=3)),
+            (3, 3, "A", "C", start + timedelta(hours=4), start + timedelta(hours=5)),
+            (4, 4, "B", "C", start + timedelta(hours=6), start + timedelta(hours=7)),
+        ])
+
+        itineraries = graph.search("A", "C", start, start + timedelta(hours=8), k=5, min_connection=timedelta(0))
+
+        self.assertEqual([flight_ids for _, _, flight_ids in itineraries], [[3], [1, 4]])
+        self.assertEqual(graph.search("A", "A", start, start + timedelta(hours=8)), [])
@@ -1,18 +1,26 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from airport_system.models import (
     Flight, Airport, Route, Airline, Airplane, Crew, AirplaneType, Order,
     Ticket, Seat, Country, City
 )
-from airport_system.serializers import OrderListSerializer
+from airport_system.serializers import (
+    ORDER_CONFLICT_MESSAGE, ORDER_CREATE_ATTEMPTS, OrderListSerializer, OrderSerializer, is_booking_conflict
+)
 
 ORDER_URL = reverse("airport_system:order-list")
 
@@ -151,6 +159,143 @@ class AuthenticatedOrderApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
+    def test_create_order_rejects_duplicate_seats(self):
+        payload = json.dumps({
+            "tickets": [
+                {"row": 3, "seat": 4, "flight": self.flight.id},
+                {"row": 3, "seat": 4, "flight": self.flight.id},
+            ]
+        })
+
+        res = self.client.post(ORDER_URL, data=payload, content_type="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["tickets"][0], {})
+        self.assertIn("requested more than once", res.data["tickets"][1]["row"][0])
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_create_order_reports_persistent_conflicts(self):
+        payload = json.dumps({"tickets": [{"row": 1, "seat": 1, "flight": self.flight.id}]})
+
+        with mock.patch("airport_system.serializers.ORDER_RETRY_DELAY", 0), mock.patch.object(
+            OrderSerializer, "_create_order", side_effect=IntegrityError("UNIQUE constraint failed: seat")
+        ) as create_order:
+            res = self.client.post(ORDER_URL, data=payload, content_type="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data, {"non_field_errors": [ORDER_CONFLICT_MESSAGE]})
+        self.assertEqual(create_order.call_count, ORDER_CREATE_ATTEMPTS)
+
+        with mock.patch.object(Ticket, "validate_tickets", side_effect=OperationalError("database is locked")):
+            res = self.client.post(ORDER_URL, data=payload, content_type="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data, {"non_field_errors": [ORDER_CONFLICT_MESSAGE]})
+        self.assertFalse(Order.objects.exists())
+
+    def test_create_order_lets_database_failures_raise(self):
+        payload = json.dumps({"tickets": [{"row": 1, "seat": 1, "flight": self.flight.id}]})
+
+        with mock.patch.object(Ticket, "validate_tickets", side_effect=OperationalError("no such table: seat")):
+            with self.assertRaises(OperationalError):
+                self.client.post(ORDER_URL, data=payload, content_type="application/json")
+
+        with mock.patch.object(
+            OrderSerializer, "_create_order", side_effect=IntegrityError("NOT NULL constraint failed: order.user_id")
+        ) as create_order:
+            with self.assertRaises(IntegrityError):
+                self.client.post(ORDER_URL, data=payload, content_type="application/json")
+        self.assertEqual(create_order.call_count, 1)
+
+    def test_booking_conflicts_by_sqlstate(self):
+        class PostgresError(Exception):
+            def __init__(self, pgcode):
+                self.pgcode = pgcode
+
+        for pgcode, conflict in (("40P01", True), ("55P03", True), ("57014", False), ("08006", False)):
+            error = OperationalError("error")
+            error.__cause__ = PostgresError(pgcode)
+            self.assertEqual(is_booking_conflict(error), conflict)
+
+    def test_create_family_order_validates_seats_in_batch(self):
+        tickets = [{"row": 5, "seat": seat, "flight": self.flight.id} for seat in range(1, 10)]
+        payload = json.dumps({"tickets": tickets})
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(ORDER_URL, data=payload, content_type="application/json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.flight.tickets.filter(row=5).count(), 9)
+        # taken seats are loaded once in validate() and once more under the flight lock
+        seat_queries = [query for query in queries if query["sql"].startswith('SELECT "airport_system_ticket"."row"')]
+        self.assertEqual(len(seat_queries), 2)
+
+    def test_seats_sold_follows_tickets(self):
+        order = Order.objects.create(user=self.user)
+        ticket = Ticket.objects.create(seat=1, row=1, flight=self.flight, order=order)
+        Ticket.objects.create(seat=2, row=1, flight=self.flight, order=order)
+
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_total, 300)
+        self.assertEqual(self.flight.seats_sold, 2)
+
+        ticket.delete()
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.tickets_available, 299)
+
+        order.status = "refunded"
+        order.save()
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 0)
+        # the booking history is kept, the seat can be sold again
+        self.assertEqual(list(order.tickets.values_list("released", flat=True)), [True])
+        Ticket.objects.create(seat=2, row=1, flight=self.flight, order=Order.objects.create(user=self.user))
+
+        order.status = "canceled"
+        order.save()
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 1)
+
+    def test_released_order_cannot_be_reopened(self):
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(seat=1, row=1, flight=self.flight, order=order)
+        order.status = "canceled"
+        order.save()
+
+        for status_name in ("paid", "pending"):
+            order.status = status_name
+            with self.assertRaises(ValidationError):
+                order.save()
+            with self.assertRaises(DjangoValidationError):
+                order.full_clean()
+
+        order.refresh_from_db()
+        self.flight.refresh_from_db()
+        self.assertEqual(order.status, "canceled")
+        self.assertEqual(self.flight.seats_sold, 0)
+        self.assertTrue(order.tickets.get().released)
+
+    def test_seats_sold_follows_cascade_and_queryset_deletes(self):
+        order = Order.objects.create(user=self.user)
+        for seat in range(1, 4):
+            Ticket.objects.create(seat=seat, row=2, flight=self.flight, order=order)
+        other_order = Order.objects.create(user=self.user)
+        Ticket.objects.create(seat=1, row=3, flight=self.flight, order=other_order)
+
+        Ticket.objects.filter(order=order, seat=1).delete()
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 3)
+
+        order.delete()
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 1)
+
+        other_order.status = "canceled"
+        other_order.save()
+        other_order.delete()
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 0)
+
     def test_ticket_unique_constraint(self):
         order = Order.objects.create(user=self.user)
         existing_ticket = Ticket.objects.create(seat=1, row=1, flight=self.flight, order=order)
@@ -176,3 +321,67 @@ class AuthenticatedOrderApiTests(TestCase):
             f" already exists for the specified flight.",
             res.data['tickets'][0]['row'][0]
         )
+
+
+# SQLite locks the whole database instead of rows, concurrent orders fail at random there
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentOrderApiTests(TransactionTestCase):
+    THREADS = 12
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test3@gmail.com",
+            "test password",
+        )
+        airline = Airline.objects.create(name="Test airline")
+        self.airplane = Airplane.objects.create(
+            name="Small airplane",
+            airline=airline,
+            airplane_type=AirplaneType.objects.create(name="Test type"),
+        )
+        Seat.objects.bulk_create(self.airplane.build_seats([2, 2]))
+        self.airplane.refresh_seat_layout()
+        country = Country.objects.create(name="USA")
+        city = City.objects.create(name="New York", country=country)
+        route = Route.objects.create(
+            source=Airport.objects.create(name="JFK", iata_code="JFK", closest_big_city=city),
+            standard_destination=Airport.objects.create(name="LGA", iata_code="LGA", closest_big_city=city),
+            distance=20,
+        )
+        self.flight = Flight.objects.create(
+            airplane=self.airplane,
+            route=route,
+            departure_time="2022-06-02 14:00",
+            estimated_arrival_time="2022-06-02 20:00",
+        )
+
+    def _order(self, ticket):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        try:
+            payload = json.dumps({"tickets": [dict(ticket, flight=self.flight.id)]})
+            return client.post(ORDER_URL, data=payload, content_type="application/json").status_code
+        finally:
+            connection.close()
+
+    def _order_concurrently(self, ticket):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            return list(executor.map(self._order, [ticket] * self.THREADS))
+
+    def test_concurrent_orders_do_not_oversell(self):
+        statuses = self._order_concurrently({"row": None, "seat": None})
+
+        self.flight.refresh_from_db()
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 4)
+        self.assertEqual(statuses.count(status.HTTP_400_BAD_REQUEST), self.THREADS - 4)
+        self.assertEqual(self.flight.tickets.count(), 4)
+        self.assertEqual(self.flight.seats_sold, 4)
+
+    def test_concurrent_orders_for_the_same_seat(self):
+        statuses = self._order_concurrently({"row": 1, "seat": 1})
+
+        self.flight.refresh_from_db()
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(statuses.count(status.HTTP_400_BAD_REQUEST), self.THREADS - 1)
+        self.assertEqual(self.flight.tickets.count(), 1)
+        self.assertEqual(self.flight.seats_sold, 1)
@@ -0,0 +1,383 @@
+import os
+import random
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from geopy.distance import geodesic, great_circle
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from airport_system.airport_index import AirportIndex, invalidate_airport_index
+from airport_system.distance_cache import get_distance_cache
+from airport_system.distance_jobs import DistanceWorkerPool
+from airport_system.distances import ELLIPSOID, geodesic_distances
+
+from airport_system.geocoding import locate_city, normalize_place_name
+from airport_system.models import (
+    Airport, City, CityPairDistance, Country, DistanceJob, GazetteerEntry, Route
+)
+
+ROUTE_URL = reverse("airport_system:route-list")
+ROUTE_BULK_URL = reverse("airport_system:route-bulk-import")
+NEAREST_AIRPORTS_URL = reverse("airport_system:airport-nearest")
+
+
+def route_detail_url(route_id):
+    return reverse("airport_system:route-detail", args=[route_id])
+
+
+def sample_airport(city_name, country_name, iata_code):
+    country, _ = Country.objects.get_or_create(name=country_name)
+    city = City.objects.create(name=city_name, country=country)
+    return Airport.objects.create(name=f"{city_name} airport", iata_code=iata_code, closest_big_city=city)
+
+
+@override_settings(GEOCODING_NETWORK_FALLBACK=False, ROUTE_DISTANCE_ASYNC=False)
+class GazetteerTests(TestCase):
+    def test_route_distance_from_bundled_gazetteer(self):
+        route = Route.objects.create(
+            source=sample_airport("New York", "the United States", "JFK"),
+            standard_destination=sample_airport("Philadelphia", "the United States", "PHL"),
+        )
+
+        self.assertAlmostEqual(route.distance, 130, delta=5)
+
+    def test_unknown_city_without_fallback(self):
+        route = Route.objects.create(
+            source=sample_airport("Atlantis", "Nowhere", "ATL"),
+            standard_destination=sample_airport("Philadelphia", "the United States", "PHL"),
+        )
+
+        self.assertEqual(route.distance, -1)
+
+    def test_lookup_is_normalized(self):
+        self.assertEqual(normalize_place_name("  São   Paulo "), "sao paulo")
+        self.assertEqual(locate_city("SÃO PAULO", "Brazil"), locate_city("Sao Paulo", "brazil"))
+        self.assertIsNotNone(locate_city("Boston", "USA"))
+
+    def test_city_coordinates_are_stored(self):
+        city = City.objects.create(name="Berlin", country=Country.objects.create(name="Germany"))
+
+        self.assertEqual(city.coordinates, (52.52, 13.405))
+        self.assertEqual(City.objects.get(pk=city.pk).latitude, 52.52)
+
+    def test_airport_coordinates_take_precedence(self):
+        airport = sample_airport("New York", "the United States", "JFK")
+        self.assertEqual(airport.coordinates, airport.closest_big_city.coordinates)
+
+        airport.latitude, airport.longitude = 40.6413, -73.7781
+        self.assertEqual(airport.coordinates, (40.6413, -73.7781))
+
+    def test_recompute_route_distances(self):
+        route = Route.objects.create(
+            source=sample_airport("Atlantis", "Nowhere", "ATL"),
+            standard_destination=sample_airport("Philadelphia", "the United States", "PHL"),
+        )
+        self.assertEqual(route.distance, -1)
+        GazetteerEntry.objects.create(city="atlantis", country="nowhere", latitude=40.7128, longitude=-74.006)
+
+        call_command("recompute_route_distances", "--unresolved-only", stdout=StringIO())
+
+        route.refresh_from_db()
+        self.assertAlmostEqual(route.distance, 130, delta=5)
+
+    def test_import_gazetteer(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as gazetteer:
+            gazetteer.write("city,country,latitude,longitude\n")
+            gazetteer.write("Vostok,Antarctica,-78.46,106.84\n")
+            gazetteer.write("Boston,United States,1,2\n")
+        self.addCleanup(os.remove, gazetteer.name)
+
+        call_command("import_gazetteer", gazetteer.name, stdout=StringIO())
+
+        self.assertEqual(locate_city("Vostok", "Antarctica"), (-78.46, 106.84))
+        self.assertEqual(GazetteerEntry.objects.get(city="boston").latitude, 1)
+
+
+@override_settings(GEOCODING_NETWORK_FALLBACK=False)
+class RouteDistanceBatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("admin@gmail.com", "test password", is_staff=True)
+        )
+
+    def test_batch_distances_match_geodesic(self):
+        sources = [(40.7128, -74.006), (51.5074, -0.1278), (-33.8688, 151.2093), (1, 1), None]
+        destinations = [(39.9526, -75.1652), (35.6762, 139.6503), (-36.8485, 174.7633), (1, 1), (2, 2)]
+
+        distances = geodesic_distances(sources, destinations)
+
+        for source, destination, distance in zip(sources[:3], destinations[:3], distances):
+            self.assertEqual(distance, int(geodesic(source, destination, ellipsoid=ELLIPSOID).kilometers))
+        self.assertEqual(distances[3:], [0, -1])
+
+    def test_batch_distances_equal_single_route_distances(self):
+        rng = random.Random(7)
+        sources = [(rng.uniform(-80, 80), rng.uniform(-180, 180)) for _ in range(2000)]
+        destinations = [(rng.uniform(-80, 80), rng.uniform(-180, 180)) for _ in range(2000)]
+
+        self.assertEqual(
+            geodesic_distances(sources, destinations),
+            [
+                int(geodesic(source, destination, ellipsoid=ELLIPSOID).kilometers)
+                for source, destination in zip(sources, destinations)
+            ],
+        )
+
+    def test_bulk_import_routes(self):
+        new_york = sample_airport("New York", "the United States", "JFK")
+        philadelphia = sample_airport("Philadelphia", "the United States", "PHL")
+        atlantis = sample_airport("Atlantis", "Nowhere", "ATL")
+        payload = [
+            {"source": new_york.id, "standard_destination": philadelphia.id},
+            {"source": philadelphia.id, "standard_destination": atlantis.id},
+            {"source": philadelphia.id, "standard_destination": new_york.id, "distance": 200},
+        ]
+
+        res = self.client.post(ROUTE_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        distances = [route["distance"] for route in res.data]
+        self.assertAlmostEqual(distances[0], 130, delta=5)
+        self.assertEqual(distances[1:], [None, 200])
+        self.assertEqual(Route.objects.count(), 3)
+        self.assertEqual(DistanceJob.objects.get().route_id, res.data[1]["id"])
+
+
+@override_settings(GEOCODING_NETWORK_FALLBACK=False)
+class CityPairDistanceCacheTests(TestCase):
+    def setUp(self):
+        get_distance_cache().clear()
+        self.new_york = sample_airport("New York", "the United States", "JFK")
+        self.philadelphia = sample_airport("Philadelphia", "the United States", "PHL")
+
+    def test_city_pair_distance_is_shared_by_both_directions(self):
+        route = Route.objects.create(source=self.new_york, standard_destination=self.philadelphia)
+        self.assertEqual(CityPairDistance.objects.count(), 1)
+
+        reverse_route = Route(source=self.philadelphia, standard_destination=self.new_york)
+        with self.assertNumQueries(0):
+            self.assertEqual(reverse_route.calculate_distance(), route.distance)
+
+        get_distance_cache().clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(reverse_route.calculate_distance(), route.distance)
+
+    def test_moving_a_city_invalidates_its_distances(self):
+        route = Route.objects.create(source=self.new_york, standard_destination=self.philadelphia)
+
+        city = self.philadelphia.closest_big_city
+        city.latitude, city.longitude = 38.9072, -77.0369
+        city.save()
+
+        self.assertFalse(CityPairDistance.objects.exists())
+        moved = Route(source=self.new_york, standard_destination=Airport.objects.get(pk=self.philadelphia.pk))
+        self.assertGreater(moved.calculate_distance(), route.distance + 150)
+
+    def test_airport_coordinates_bypass_the_city_cache(self):
+        self.new_york.latitude, self.new_york.longitude = 40.6413, -73.7781
+        self.new_york.save()
+
+        Route.objects.create(source=self.new_york, standard_destination=self.philadelphia)
+
+        self.assertFalse(CityPairDistance.objects.exists())
+
+
+@override_settings(GEOCODING_NETWORK_FALLBACK=False, ROUTE_DISTANCE_ASYNC=True)
+class DistanceJobTests(TestCase):
+    def setUp(self):
+        self.route = Route.objects.create(
+            source=sample_airport("Atlantis", "Nowhere", "ATL"),
+            standard_destination=sample_airport("Philadelphia", "the United States", "PHL"),
+        )
+
+    def test_route_with_unlocated_city_is_pending(self):
+        self.assertIsNone(self.route.distance)
+        self.assertEqual(DistanceJob.objects.get(route=self.route).status, "pending")
+
+    def test_worker_resolves_pending_route(self):
+        GazetteerEntry.objects.create(city="atlantis", country="nowhere", latitude=40.7128, longitude=-74.006)
+
+        call_command("resolve_route_distances", "--once", "--workers", "1", stdout=StringIO())
+
+        self.route.refresh_from_db()
+        self.assertAlmostEqual(self.route.distance, 130, delta=5)
+        self.assertFalse(DistanceJob.objects.exists())
+
+    def test_worker_retries_then_fails(self):
+        pool = DistanceWorkerPool(workers=1, max_attempts=2, retry_delay=timedelta(0))
+
+        self.assertEqual(pool.run_once(), (0, 1))
+        job = DistanceJob.objects.get(route=self.route)
+        self.assertEqual((job.status, job.attempts), ("pending", 1))
+        self.assertLessEqual(job.run_after, timezone.now())
+
+        pool.run_once()
+        job.refresh_from_db()
+        self.route.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        self.assertEqual(self.route.distance, -1)
+        self.assertEqual(pool.run_once(), (0, 0))
+
+    def test_resaving_pending_route_keeps_its_job(self):
+        run_after = timezone.now() + timedelta(hours=1)
+        DistanceJob.objects.filter(route=self.route).update(attempts=2, run_after=run_after)
+
+        route = Route.objects.get(pk=self.route.pk)
+        route.status = "emergency"
+        route.save()
+
+        route.refresh_from_db()
+        self.assertIsNone(route.distance)
+        job = DistanceJob.objects.get(route=self.route)
+        self.assertEqual((job.attempts, job.run_after), (2, run_after))
+
+    def test_moved_route_restarts_failed_job(self):
+        DistanceJob.objects.filter(route=self.route).update(status="failed", attempts=5)
+        Route.objects.filter(pk=self.route.pk).update(distance=-1)
+
+        route = Route.objects.get(pk=self.route.pk)
+        route.standard_destination = sample_airport("Lemuria", "Nowhere", "LEM")
+        route.save()
+
+        route.refresh_from_db()
+        self.assertIsNone(route.distance)
+        job = DistanceJob.objects.get(route=self.route)
+        self.assertEqual((job.status, job.attempts), ("pending", 0))
+
+    def test_worker_retries_unexpected_errors(self):
+        pool = DistanceWorkerPool(workers=1, max_attempts=2, retry_delay=timedelta(0))
+
+        with mock.patch.object(City, "locate", side_effect=RuntimeError("gazetteer unavailable")):
+            self.assertEqual(pool.run_once(), (0, 1))
+
+        job = DistanceJob.objects.get(route=self.route)
+        self.assertEqual((job.status, job.attempts), ("pending", 1))
+        self.assertIn("gazetteer unavailable", job.last_error)
+
+
+@override_settings(GEOCODING_NETWORK_FALLBACK=False, ROUTE_DISTANCE_ASYNC=False)
+class AlternateAirportTests(TestCase):
+    def setUp(self):
+        invalidate_airport_index()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("admin@gmail.com", "test password", is_staff=True)
+        )
+        self.new_york = sample_airport("New York", "the United States", "JFK")
+        self.philadelphia = sample_airport("Philadelphia", "the United States", "PHL")
+        self.boston = sample_airport("Boston", "the United States", "BOS")
+        # Trenton, half way between New York and Philadelphia
+        self.trenton = Airport.objects.create(
+            name="Trenton airport", iata_code="TTN", closest_big_city=self.philadelphia.closest_big_city,
+            latitude=40.2774, longitude=-74.8160,
+        )
+        self.route = Route.objects.create(source=self.new_york, standard_destination=self.philadelphia)
+
+    def test_index_matches_brute_force(self):
+        generator = random.Random(7)
+        airports = [
+            (airport_id, generator.uniform(-90, 90), generator.uniform(-180, 180)) for airport_id in range(200)
+        ]
+        index = AirportIndex(airports)
+
+        for latitude, longitude in ((0, 179.9), (89.9, 0), (-45, -120), (10, 10)):
+            by_distance = sorted(
+                airports, key=lambda airport: great_circle((latitude, longitude), airport[1:]).kilometers
+            )
+            nearest = index.nearest(latitude, longitude, k=4, exclude={by_distance[0][0]})
+
+            self.assertEqual([airport_id for airport_id, _ in nearest], [airport[0] for airport in by_distance[1:5]])
+            self.assertAlmostEqual(
+                nearest[0][1], great_circle((latitude, longitude), by_distance[1][1:]).kilometers, delta=1
+            )
+
+    def test_nearest_airports(self):
+        res = self.client.get(NEAREST_AIRPORTS_URL, {"latitude": 40.3, "longitude": -74.8, "k": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([airport["iata_code"] for airport in res.data], ["TTN", "PHL"])
+        self.assertLess(res.data[0]["distance_km"], 5)
+
+    def test_nearest_airports_bad_parameters(self):
+        for params in ({"latitude": 40}, {"latitude": 100, "longitude": 0}, {"latitude": 0, "longitude": 0, "k": 0}):
+            res = self.client.get(NEAREST_AIRPORTS_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_new_airport_is_indexed(self):
+        self.client.get(NEAREST_AIRPORTS_URL, {"latitude": 42.36, "longitude": -71.06, "k": 1})
+        Airport.objects.create(
+            name="Logan airport", iata_code="BOL", closest_big_city=self.boston.closest_big_city,
+            latitude=42.3656, longitude=-71.0096,
+        )
+
+        res = self.client.get(NEAREST_AIRPORTS_URL, {"latitude": 42.3656, "longitude": -71.0096, "k": 1})
+
+        self.assertEqual(res.data[0]["iata_code"], "BOL")
+
+    def test_route_alternates(self):
+        res = self.client.get(reverse("airport_system:route-alternates", args=[self.route.id]), {"k": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([airport["iata_code"] for airport in res.data], ["TTN", "BOS"])
+
+    def test_emergency_without_destination_is_diverted(self):
+        res = self.client.patch(route_detail_url(self.route.id), {"status": "emergency"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["emergent_destination"], self.trenton.id)
+
+    def test_emergency_with_destination_is_kept(self):
+        res = self.client.patch(
+            route_detail_url(self.route.id), {"status": "emergency", "emergent_destination": self.boston.id}
+        )
+
+        self.assertEqual(res.data["emergent_destination"], self.boston.id)
+
+
+@override_settings(GEOCODING_NETWORK_FALLBACK=False, ROUTE_DISTANCE_ASYNC=False)
+class RouteFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user("test@gmail.com", "test password"))
+        new_york = sample_airport("New York", "the United States", "JFK")
+        sao_paulo = sample_airport("São Paulo", "Brazil", "GRU")
+        berlin = sample_airport("Berlin", "Germany", "BER")
+        self.new_york_berlin = Route.objects.create(source=new_york, standard_destination=berlin, distance=1)
+        self.berlin_sao_paulo = Route.objects.create(source=berlin, standard_destination=sao_paulo, distance=1)
+        self.sao_paulo_new_york = Route.objects.create(source=sao_paulo, standard_destination=new_york, distance=1)
+
+    def _route_ids(self, **params):
+        res = self.client.get(ROUTE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return sorted(route["id"] for route in res.data["results"])
+
+    def test_source_and_destination_filters(self):
+        self.assertEqual(self._route_ids(city_from="Berlin"), [self.berlin_sao_paulo.id])
+        self.assertEqual(self._route_ids(city_to="Berlin"), [self.new_york_berlin.id])
+        self.assertEqual(self._route_ids(country_from="Germany"), [self.berlin_sao_paulo.id])
+        self.assertEqual(self._route_ids(country_to="Germany"), [self.new_york_berlin.id])
+        self.assertEqual(self._route_ids(route="New York-Berlin"), [self.new_york_berlin.id])
+
+    def test_names_are_normalized_and_prefix_matched(self):
+        self.assertEqual(self._route_ids(city_from="sao paulo"), [self.sao_paulo_new_york.id])
+        self.assertEqual(self._route_ids(city_to="  SÃO "), [self.berlin_sao_paulo.id])
+        self.assertEqual(self._route_ids(country_to="USA"), [self.sao_paulo_new_york.id])
+        self.assertEqual(self._route_ids(country_from="the united"), [self.new_york_berlin.id])
+        self.assertEqual(self._route_ids(city_from="york"), [])
+
+    def test_benchmark_route_filters(self):
+        out = StringIO()
+
+        call_command("benchmark_route_filters", "--cities", "40", "--routes", "200", "--repeat", "1", stdout=out)
+
+        self.assertIn("search_name", out.getvalue())
+        self.assertEqual(Route.objects.count(), 3)
@@ -0,0 +1,203 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from airport_system.models import (
+    Flight, Airport, Route, Airline, Airplane, AirplaneType, Seat, City, Country, SeatHold, Ticket
+)
+from airport_system.seat_holds import (
+    DatabaseSeatHoldBackend, HoldLimitExceeded, LocalMemorySeatHoldBackend, SeatHoldSweeper, get_seat_hold_backend
+)
+
+ORDER_URL = reverse("airport_system:order-list")
+
+
+def holds_url(flight_id):
+    return reverse("airport_system:flight-holds", args=[flight_id])
+
+
+def flight_detail_url(flight_id):
+    return reverse("airport_system:flight-detail", args=[flight_id])
+
+
+@override_settings(SEAT_HOLD_SWEEP_INTERVAL=None)
+class SeatHoldApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@gmail.com",
+            "test password",
+        )
+        self.other_user = get_user_model().objects.create_user(
+            "other@gmail.com",
+            "test password",
+        )
+        refresh = RefreshToken.for_user(self.user)
+        self.token = refresh.access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+        self.other_client = APIClient()
+        self.other_client.force_authenticate(self.other_user)
+
+    @classmethod
+    def setUpTestData(cls):
+        airline = Airline.objects.create(name="Test airline")
+        airplane = Airplane.objects.create(
+            name="Test airplane",
+            airline=airline,
+            airplane_type=AirplaneType.objects.create(name="Test type"),
+        )
+        for seat_row in range(1, 6):
+            for seat_number in range(1, 7):
+                Seat.objects.create(
+                    airplane=airplane,
+                    row=seat_row,
+                    seat_number=seat_number,
+                )
+        country = Country.objects.create(name="Poland")
+        city = City.objects.create(name="Warsaw", country=country)
+        route = Route.objects.create(
+            source=Airport.objects.create(name="Warsaw Chopin Airport", iata_code="WAW", closest_big_city=city),
+            standard_destination=Airport.objects.create(name="Warsaw Modlin Airport", iata_code="WMI", closest_big_city=city),
+            distance=40,
+        )
+        cls.flight = Flight.objects.create(
+            airplane=airplane,
+            route=route,
+            departure_time="2022-06-02 14:00",
+            estimated_arrival_time="2022-06-02 20:00",
+        )
+
+    def _order(self, client, row, seat):
+        payload = json.dumps({"tickets": [{"row": row, "seat": seat, "flight": self.flight.id}]})
+        return client.post(ORDER_URL, data=payload, content_type="application/json")
+
+    def test_hold_seat(self):
+        res = self.client.post(holds_url(self.flight.id), {"row": 2, "seat": 3})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(SeatHold.objects.filter(flight=self.flight, row=2, seat=3, user=self.user).exists())
+
+        res = self.other_client.get(flight_detail_url(self.flight.id))
+        self.assertEqual(res.data["held_places"], [{"row": 2, "seat": 3}])
+
+    def test_held_seat_cannot_be_held_or_ordered_by_others(self):
+        self.client.post(holds_url(self.flight.id), {"row": 2, "seat": 3})
+
+        res = self.other_client.post(holds_url(self.flight.id), {"row": 2, "seat": 3})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self._order(self.other_client, 2, 3)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("on hold", res.data["tickets"][0]["seat"][0])
+
+    def test_holder_orders_held_seat_and_hold_is_released(self):
+        self.client.post(holds_url(self.flight.id), {"row": 2, "seat": 3})
+
+        res = self._order(self.client, 2, 3)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(SeatHold.objects.exists())
+        self.assertTrue(Ticket.objects.filter(flight=self.flight, row=2, seat=3).exists())
+
+    @override_settings(SEAT_HOLD_MAX_PER_USER=2)
+    def test_hold_limit_per_user_and_flight(self):
+        def hold(client, seat):
+            return client.post(holds_url(self.flight.id), {"row": 1, "seat": seat})
+
+        self.assertEqual(hold(self.client, 1).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(hold(self.client, 2).status_code, status.HTTP_201_CREATED)
+
+        res = hold(self.client, 3)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("at most 2 seats", res.data["seat"])
+
+        # extending a hold doesn't count against the limit, other users have their own
+        self.assertEqual(hold(self.client, 2).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(hold(self.other_client, 3).status_code, status.HTTP_201_CREATED)
+
+        self.client.delete(holds_url(self.flight.id), {"row": 1, "seat": 1})
+        self.assertEqual(hold(self.client, 4).status_code, status.HTTP_201_CREATED)
+
+    def test_backends_enforce_hold_limit(self):
+        expires_at = timezone.now() + timedelta(minutes=5)
+        for backend in (DatabaseSeatHoldBackend(), LocalMemorySeatHoldBackend()):
+            self.assertTrue(backend.hold(self.flight.id, 3, 1, self.user.pk, expires_at, limit=2))
+            self.assertTrue(backend.hold(self.flight.id, 3, 2, self.user.pk, expires_at, limit=2))
+            with self.assertRaises(HoldLimitExceeded):
+                backend.hold(self.flight.id, 3, 3, self.user.pk, expires_at, limit=2)
+            # renewing a hold is not a new one
+            self.assertTrue(backend.hold(self.flight.id, 3, 2, self.user.pk, expires_at, limit=2))
+            self.assertTrue(backend.hold(self.flight.id, 3, 3, self.other_user.pk, expires_at, limit=2))
+            self.assertEqual(len(backend.active_holds(self.flight.id)), 3)
+            backend.release(self.flight.id, [(3, 1), (3, 2)], self.user.pk)
+            backend.release(self.flight.id, [(3, 3)], self.other_user.pk)
+
+    def test_release_hold_of_booked_seat(self):
+        self.client.post(holds_url(self.flight.id), {"row": 2, "seat": 3})
+        self.assertEqual(self._order(self.client, 2, 3).status_code, status.HTTP_201_CREATED)
+
+        res = self.client.delete(holds_url(self.flight.id), {"row": 2, "seat": 3})
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            self.client.delete(holds_url(self.flight.id), {"row": 9, "seat": 3}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    def test_backend_follows_settings(self):
+        self.assertIsInstance(get_seat_hold_backend(), DatabaseSeatHoldBackend)
+
+        with override_settings(SEAT_HOLD_BACKEND="airport_system.seat_holds.LocalMemorySeatHoldBackend"):
+            backend = get_seat_hold_backend()
+            self.assertIsInstance(backend, LocalMemorySeatHoldBackend)
+            self.assertIs(get_seat_hold_backend(), backend)
+
+            self.client.post(holds_url(self.flight.id), {"row": 2, "seat": 3})
+            self.assertEqual(backend.active_holds(self.flight.id), {(2, 3): self.user.pk})
+            self.assertFalse(SeatHold.objects.exists())
+            backend.release(self.flight.id, [(2, 3)], self.user.pk)
+
+        self.assertIsInstance(get_seat_hold_backend(), DatabaseSeatHoldBackend)
+
+    def test_release_hold(self):
+        self.client.post(holds_url(self.flight.id), {"row": 2, "seat": 3})
+
+        res = self.client.delete(holds_url(self.flight.id), {"row": 2, "seat": 3})
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._order(self.other_client, 2, 3).status_code, status.HTTP_201_CREATED)
+
+    def test_expired_hold_is_ignored_and_swept(self):
+        SeatHold.objects.create(
+            flight=self.flight, row=1, seat=1, user=self.user,
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(self._order(self.other_client, 1, 1).status_code, status.HTTP_201_CREATED)
+
+        SeatHold.objects.create(
+            flight=self.flight, row=1, seat=2, user=self.user,
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(SeatHoldSweeper(DatabaseSeatHoldBackend(), interval=60).sweep_once(), 2)
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_local_memory_backend(self):
+        backend = LocalMemorySeatHoldBackend()
+        expires_at = timezone.now() + timedelta(minutes=5)
+
+        self.assertTrue(backend.hold(1, 2, 3, self.user.pk, expires_at))
+        self.assertFalse(backend.hold(1, 2, 3, self.other_user.pk, expires_at))
+        self.assertEqual(backend.active_holds(1), {(2, 3): self.user.pk})
+
+        backend.hold(1, 2, 4, self.user.pk, timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(backend.get_holder(1, 2, 4))
+        self.assertEqual(backend.purge_expired(), 1)
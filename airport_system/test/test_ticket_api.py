@@ -12,6 +12,7 @@ from airport_system.models import (
     Flight, Airport, Route, Airline, Airplane, AirplaneType, Order,
     Ticket, Seat, City, Country, Crew
 )
+from airport_system.seat_map import SeatMap
 
 
 def allocate_url(ticket_id):
@@ -129,6 +130,63 @@ class AuthenticatedTicketApiTests(TestCase):
         self.assertEqual(payload["row"], self.ticket_not_allocated.row)
         self.assertEqual(payload["seat"], self.ticket_not_allocated.seat)
 
+    def test_allocate_seat_skips_full_rows(self):
+        for seat_number in range(2, 16):
+            Ticket(seat=seat_number, row=1, flight=self.flight, order=self.order).save()
+
+        with self.assertNumQueries(2):
+            row, seat_number = self.ticket_not_allocated.get_last_available_seat()
+
+        self.assertEqual((row, seat_number), (2, 1))
+
+    def test_seat_map_first_free(self):
+        seat_map = SeatMap(
+            seats=[(1, 1), (1, 2), (2, 1), (2, 2), (2, 3)],
+            taken=[(1, 1), (1, 2), (2, 1)],
+        )
+
+        self.assertEqual(seat_map.first_free(), (2, 2))
+        self.assertEqual(seat_map.free_count(), 2)
+        self.assertFalse(seat_map.is_free(2, 1))
+        self.assertFalse(seat_map.has_seat(2, 4))
+
+    def test_seat_map_allocate_group(self):
+        seat_map = SeatMap.from_layout([0b111111] * 3, taken=[(1, 3), (2, 2), (2, 5)])
+
+        self.assertEqual(seat_map.allocate_group(3), [(1, 4), (1, 5), (1, 6)])
+        self.assertEqual(seat_map.allocate_group(5), [(3, 1), (3, 2), (3, 3), (3, 4), (3, 5)])
+        self.assertEqual(
+            seat_map.allocate_group(4),
+            [(1, 1), (1, 2), (2, 3), (2, 4)]
+        )
+
+    def test_allocate_order_seats_together(self):
+        order = Order.objects.create(user=self.user)
+        tickets = [Ticket.objects.create(flight=self.flight, order=order) for _ in range(3)]
+
+        res = self.client.patch(f"{allocate_url(tickets[0].id)}?group=true")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(ticket["row"], ticket["seat"]) for ticket in res.data],
+            [(1, 2), (1, 3), (1, 4)]
+        )
+
+    def test_allocate_order_seats_counts_tickets_with_a_row_only(self):
+        order = Order.objects.create(user=self.user)
+        with_row = Ticket.objects.create(flight=self.flight, order=order, row=3)
+        Ticket.objects.create(flight=self.flight, order=order)
+        seated = Ticket.objects.create(flight=self.flight, order=order, row=4, seat=1)
+
+        res = self.client.patch(f"{allocate_url(with_row.id)}?group=true")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+        self.assertTrue(all(ticket["seat"] is not None for ticket in res.data))
+
+        res = self.client.patch(f"{allocate_url(seated.id)}?group=true")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     #TEMPORARY CODE
     def test_unique_row_seat_flight(self):
         # Тест уникальности комбинаций row, seat и flight
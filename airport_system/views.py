@@ -1,13 +1,19 @@
-from datetime import datetime
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+
+from django.utils import timezone
 
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db.models import Q
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
 from rest_framework.generics import GenericAPIView
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
@@ -25,8 +31,12 @@ from .models import (
     AirlineRating,
     Ticket,
     Crew,
+    AirlineRatingAggregate,
+    AirlineRatingDailyBucket,
 )
 
+from airport_system.pagination import KeysetCursorPagination
+from airport_system.parsers import NDJSONParser
 from airport_system.permissions import (
     IsAdminOrIfAuthenticatedReadOnly,
     ReadOnlyOrAdminPermission
@@ -49,7 +59,15 @@ from .serializers import (
     FlightDetailSerializer,
     OrderSerializer,
     OrderListSerializer, AirplaneImageSerializer, AirlineSerializer, AirlineListSerializer, AirplaneCreateSerializer,
-    RatingSerializer, TicketSerializer, CrewSerializer,
+    RatingSerializer, TicketSerializer, CrewSerializer, SeatHoldSerializer, RatingIngestSerializer,
+    AirlineLeaderboardSerializer, NearbyAirportSerializer, ItinerarySerializer, AutocompleteSuggestionSerializer,
+)
+from .airport_index import get_airport_index
+from .geocoding import normalize_country_name
+from .name_search import get_autocomplete_index, matching_names
+from .route_graph import get_flight_graph
+from .seat_holds import (
+    HoldLimitExceeded, get_seat_hold_backend, get_hold_ttl, get_max_holds_per_user, ensure_sweeper_started
 )
 
 
@@ -73,6 +91,30 @@ class CityViewSet(
         return self.serializer_class
 
 
+MAX_NEARBY_AIRPORTS = 50
+MAX_AUTOCOMPLETE_SUGGESTIONS = 25
+
+
+def nearby_airports_count(request, default=5):
+    try:
+        k = int(request.query_params.get("k", default))
+    except ValueError:
+        k = 0
+    if not 1 <= k <= MAX_NEARBY_AIRPORTS:
+        raise ParseError(f"k must be a number from 1 to {MAX_NEARBY_AIRPORTS}")
+    return k
+
+
+def with_distances(airports, nearest):
+    # airports by id, in the order of the (airport id, km) pairs
+    result = []
+    for airport_id, distance in nearest:
+        if airport_id in airports:
+            airports[airport_id].distance_km = distance
+            result.append(airports[airport_id])
+    return result
+
+
 class AirportViewSet(
     mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
 ):
@@ -86,6 +128,67 @@ class AirportViewSet(
 
         return self.serializer_class
 
+    @extend_schema(
+        description="Airports by IATA code or name and cities by name, starting with q, the best match first.",
+        parameters=[
+            OpenApiParameter(name="q", description="Beginning of a name or code (ex. ?q=ber)", type=OpenApiTypes.STR),
+            OpenApiParameter(
+                name="type",
+                description="Only airports or only cities (ex. ?type=airport)",
+                type=OpenApiTypes.STR,
+                enum=["airport", "city"]
+            ),
+            OpenApiParameter(
+                name="limit",
+                description=f"Number of suggestions, at most {MAX_AUTOCOMPLETE_SUGGESTIONS} (ex. ?limit=10)",
+                type=OpenApiTypes.INT
+            )
+        ],
+        responses={status.HTTP_200_OK: AutocompleteSuggestionSerializer(many=True)}
+    )
+    @action(methods=["GET"], detail=False, url_path="autocomplete")
+    def autocomplete(self, request):
+        query = request.query_params.get("q", "")
+        kind = request.query_params.get("type")
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_AUTOCOMPLETE_SUGGESTIONS:
+            raise ParseError(f"limit must be a number from 1 to {MAX_AUTOCOMPLETE_SUGGESTIONS}")
+        if kind not in (None, "airport", "city"):
+            raise ParseError("type must be airport or city")
+
+        suggestions = get_autocomplete_index().complete(query, limit=limit, kind=kind)
+        return Response(AutocompleteSuggestionSerializer(suggestions, many=True).data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name="latitude", type=OpenApiTypes.FLOAT, required=True),
+            OpenApiParameter(name="longitude", type=OpenApiTypes.FLOAT, required=True),
+            OpenApiParameter(
+                name="k",
+                description=f"Number of airports, at most {MAX_NEARBY_AIRPORTS} (ex. ?k=5)",
+                type=OpenApiTypes.INT
+            )
+        ],
+        responses={status.HTTP_200_OK: NearbyAirportSerializer(many=True)}
+    )
+    @action(methods=["GET"], detail=False, url_path="nearest")
+    def nearest(self, request):
+        try:
+            latitude = float(request.query_params["latitude"])
+            longitude = float(request.query_params["longitude"])
+        except (KeyError, ValueError):
+            raise ParseError("latitude and longitude are required numbers")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ParseError("latitude must be within [-90, 90] and longitude within [-180, 180]")
+
+        nearest = get_airport_index().nearest(latitude, longitude, k=nearby_airports_count(request))
+        airports = self.get_queryset().in_bulk([airport_id for airport_id, _ in nearest])
+
+        return Response(NearbyAirportSerializer(with_distances(airports, nearest), many=True).data)
+
 
 class AirplaneTypeViewSet(
     mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
@@ -115,7 +218,7 @@ class AirplaneViewSet(
     def get_serializer_class(self):
         if self.action == "list":
             return AirplaneListSerializer
-        if self.action == "create":
+        if self.action in ("create", "bulk_register"):
             return AirplaneCreateSerializer
         if self.action == "upload_image":
             return AirplaneImageSerializer
@@ -136,6 +239,30 @@ class AirplaneViewSet(
         serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @extend_schema(
+        description="Register a fleet: create many airplanes and all of their seats in one request.",
+        request=AirplaneCreateSerializer(many=True),
+        responses={status.HTTP_201_CREATED: AirplaneCreateSerializer(many=True)}
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk",
+        permission_classes=[IsAdminUser],
+    )
+    def bulk_register(self, request):
+        serializer = self.get_serializer(data=request.data, many=True)
+
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AirlineLeaderboardPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
 
 class AirlineViewSet(
     mixins.ListModelMixin,
@@ -143,7 +270,7 @@ class AirlineViewSet(
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet
 ):
-    queryset = Airline.objects.all()
+    queryset = Airline.objects.select_related("rating_aggregate")
     serializer_class = AirlineSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
@@ -165,10 +292,111 @@ class AirlineViewSet(
 
         return self.serializer_class
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        period = {}
+
+        for param in ("window_days", "half_life_days"):
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                period[param] = int(value)
+            except ValueError:
+                period[param] = 0
+            if not 0 < period[param] <= AirlineRatingDailyBucket.MAX_PERIOD_DAYS:
+                raise ParseError(
+                    f"{param} must be a number of days between 1 and {AirlineRatingDailyBucket.MAX_PERIOD_DAYS}"
+                )
+
+        context["rating_period"] = period
+        return context
 
-class AirlineRatingPagination(PageNumberPagination):
-    page_size = 10
-    max_page_size = 100
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="window_days",
+                description="Rate on the ratings of the last days only, up to 3650 (ex. ?window_days=30)",
+                type=OpenApiTypes.INT
+            ),
+            OpenApiParameter(
+                name="half_life_days",
+                description="Weigh ratings down by half every that many days, up to 3650 (ex. ?half_life_days=14)",
+                type=OpenApiTypes.INT
+            )
+        ]
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @staticmethod
+    def _leaderboard_queryset(ordering):
+        aggregates = AirlineRatingAggregate.objects.filter(ratings_count__gt=0).select_related("airline")
+
+        if ordering == "overall_rating":
+            return aggregates.order_by("-overall_score", "airline_id"), "overall_score"
+
+        category = AirlineRatingAggregate.CATEGORIES.get(ordering)
+        if category is None:
+            raise ParseError(
+                f"ordering must be one of: overall_rating, {', '.join(AirlineRatingAggregate.CATEGORIES)}"
+            )
+        aggregates = aggregates.annotate(
+            score=Cast(f"{category}_sum", FloatField()) / F(f"{category}_count")
+        )
+        return aggregates.order_by(F("score").desc(nulls_last=True), "airline_id"), "score"
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="ordering",
+                description="Rank by overall_rating (default) or by a category (ex. ?ordering=avg_crew)",
+                type=OpenApiTypes.STR
+            )
+        ],
+        responses={status.HTTP_200_OK: AirlineLeaderboardSerializer(many=True)}
+    )
+    @action(methods=["GET"], detail=False, url_path="leaderboard")
+    def leaderboard(self, request):
+        aggregates, score = self._leaderboard_queryset(request.query_params.get("ordering", "overall_rating"))
+
+        paginator = AirlineLeaderboardPagination()
+        page = paginator.paginate_queryset(aggregates, request, view=self)
+
+        # Competition ranks, the first rank of a group of ties is its position in the board
+        offset = paginator.page.start_index() - 1
+        for position, aggregate in enumerate(page):
+            value = getattr(aggregate, score)
+            if value is None:
+                aggregate.rank = None
+            elif position == 0:
+                # the page may start inside a group of ties
+                aggregate.rank = aggregates.filter(**{f"{score}__gt": value}).count() + 1
+            elif value == getattr(page[position - 1], score):
+                aggregate.rank = page[position - 1].rank
+            else:
+                aggregate.rank = offset + position + 1
+
+        serializer = AirlineLeaderboardSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @extend_schema(responses={status.HTTP_200_OK: AirlineLeaderboardSerializer})
+    @action(methods=["GET"], detail=True, url_path="rank")
+    def rank(self, request, pk=None):
+        airline = self.get_object()
+        try:
+            aggregate = airline.rating_aggregate
+        except ObjectDoesNotExist:
+            aggregate = None
+        if aggregate is None or not aggregate.ratings_count:
+            return Response({"detail": "The airline has no ratings yet."}, status=status.HTTP_404_NOT_FOUND)
+
+        aggregate.rank = aggregate.get_rank()
+        return Response(AirlineLeaderboardSerializer(aggregate).data)
+
+
+class AirlineRatingPagination(KeysetCursorPagination):
+    ordering = ("-created_time", "-id")
 
 
 class AirlineRatingViewSet(
@@ -204,6 +432,31 @@ class AirlineRatingViewSet(
             return Response({"status": "Query parameter 'airline' is required."},
                             status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        request=RatingIngestSerializer(many=True),
+        description="Import ratings from a JSON array or an NDJSON (application/x-ndjson) stream. "
+                    "Invalid records are skipped and reported by their index in the array, "
+                    "or their line number in the stream.",
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk",
+        permission_classes=[IsAdminUser],
+        parser_classes=[JSONParser, NDJSONParser],
+    )
+    def bulk_ingest(self, request):
+        records = request.data
+        if isinstance(records, list):
+            created, errors = RatingIngestSerializer.ingest(enumerate(records))
+        elif isinstance(records, Iterator):
+            # NDJSON, records come numbered by their line
+            created, errors = RatingIngestSerializer.ingest(records, position="line")
+        else:
+            raise ParseError("Expected a list of ratings.")
+
+        return Response({"created": created, "errors": errors}, status=status.HTTP_200_OK)
+
 
 class CrewViewSet(
     mixins.CreateModelMixin,
@@ -215,6 +468,10 @@ class CrewViewSet(
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
 
+class RoutePagination(KeysetCursorPagination):
+    ordering = ("id",)
+
+
 class RouteViewSet(
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
@@ -227,6 +484,7 @@ class RouteViewSet(
         "standard_destination",
     )
     serializer_class = RouteSerializer
+    pagination_class = RoutePagination
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
     def get_serializer_class(self):
@@ -238,40 +496,83 @@ class RouteViewSet(
 
         return RouteSerializer
 
+    @extend_schema(
+        request=RouteSerializer(many=True),
+        responses={status.HTTP_201_CREATED: RouteSerializer(many=True)}
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="bulk",
+        permission_classes=[IsAdminUser],
+    )
+    def bulk_import(self, request):
+        serializer = self.get_serializer(data=request.data, many=True)
+
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="k",
+                description=f"Number of airports, at most {MAX_NEARBY_AIRPORTS} (ex. ?k=3)",
+                type=OpenApiTypes.INT
+            )
+        ],
+        responses={status.HTTP_200_OK: NearbyAirportSerializer(many=True)}
+    )
+    @action(methods=["GET"], detail=True, url_path="alternates")
+    def alternates(self, request, pk=None):
+        """Airports nearest to the middle of the route, to divert to in an emergency."""
+        route = self.get_object()
+        alternates = route.alternate_airports(k=nearby_airports_count(request, default=3))
+
+        airports = []
+        for airport, distance in alternates:
+            airport.distance_km = distance
+            airports.append(airport)
+        return Response(NearbyAirportSerializer(airports, many=True).data)
+
     def get_queryset(self):
+        # Names are resolved to city and country ids on the indexed search_name columns first,
+        # routes are then filtered on the airport foreign keys
+        queryset = super().get_queryset()
         country_from = self.request.query_params.get("country_from")
         country_to = self.request.query_params.get("country_to")
         city_from = self.request.query_params.get("city_from")
         city_to = self.request.query_params.get("city_to")
         route = self.request.query_params.get("route")
 
+        if route:
+            route = route.split("-")
+            city_from, city_to = route[0], route[-1]
+
         if country_from:
-            self.queryset = self.queryset.filter(
-                source__closest_big_city__country__name__icontains=country_from
+            queryset = queryset.filter(
+                source__closest_big_city__country__in=matching_names(
+                    Country.objects.all(), country_from, normalize_country_name
+                )
             )
 
         if country_to:
-            self.queryset = self.queryset.filter(
-                destination__closest_big_city__country__name__icontains=country_to
+            queryset = queryset.filter(
+                standard_destination__closest_big_city__country__in=matching_names(
+                    Country.objects.all(), country_to, normalize_country_name
+                )
             )
 
         if city_from:
-            self.queryset = self.queryset.filter(
-                source__closest_big_city__name__icontains=city_from
+            queryset = queryset.filter(
+                source__closest_big_city__in=matching_names(City.objects.all(), city_from)
             )
 
         if city_to:
-            self.queryset = self.queryset.filter(
-                source__closest_big_city__name__icontains=city_to
+            queryset = queryset.filter(
+                standard_destination__closest_big_city__in=matching_names(City.objects.all(), city_to)
             )
-
-        if route:
-            route = route.split("-")
-            self.queryset = self.queryset.filter(
-                Q(source__closest_big_city__name__icontains=route[0]),
-                Q(destination__closest_big_city__name__icontains=route[-1]),
-            )
-        return self.queryset
+        return queryset
 
     @extend_schema(
         parameters=[
@@ -307,6 +608,14 @@ class RouteViewSet(
         return response
 
 
+class FlightPagination(KeysetCursorPagination):
+    ordering = ("departure_time", "id")
+
+
+MAX_ITINERARIES = 10
+MAX_ITINERARY_LEGS = 4
+
+
 class FlightViewSet(
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
@@ -324,6 +633,7 @@ class FlightViewSet(
         .prefetch_related("crew")
     )
     serializer_class = FlightSerializer
+    pagination_class = FlightPagination
     permission_classes = (ReadOnlyOrAdminPermission,)
 
     def get_serializer_class(self):
@@ -336,6 +646,8 @@ class FlightViewSet(
         return FlightSerializer
 
     def get_queryset(self):
+        # start from a fresh queryset, the class level one caches its results between requests
+        self.queryset = super().get_queryset()
         airport_from = self.request.query_params.get("airport_from")
         airport_to = self.request.query_params.get("airport_to")
         date = self.request.query_params.get("date")
@@ -374,10 +686,147 @@ class FlightViewSet(
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @extend_schema(
+        description="Allocate seats to every check-in-pending ticket of the flight in one pass.",
+        request=None,
+        responses={status.HTTP_200_OK: OpenApiTypes.OBJECT}
+    )
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path="allocate-seats",
+        permission_classes=[IsAdminUser],
+    )
+    def allocate_seats(self, request, pk=None):
+        flight = self.get_object()
+        allocated, unallocated = flight.allocate_pending_seats()
 
-class OrderPagination(PageNumberPagination):
-    page_size = 10
-    max_page_size = 100
+        return Response({"allocated": allocated, "unallocated": unallocated}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description="Itineraries of up to max_legs flights, the earliest arrival first.",
+        parameters=[
+            OpenApiParameter(
+                name="airport_from",
+                description="IATA code of the airport of departure (ex. ?airport_from=KBP)",
+                type=OpenApiTypes.STR,
+                required=True
+            ),
+            OpenApiParameter(
+                name="airport_to",
+                description="IATA code of the airport of destination (ex. ?airport_to=JFK)",
+                type=OpenApiTypes.STR,
+                required=True
+            ),
+            OpenApiParameter(
+                name="date",
+                description="Date of departure (ex. ?date=2024-01-18)",
+                type=OpenApiTypes.DATE,
+                required=True
+            ),
+            OpenApiParameter(
+                name="k",
+                description=f"Number of itineraries, at most {MAX_ITINERARIES} (ex. ?k=3)",
+                type=OpenApiTypes.INT
+            ),
+            OpenApiParameter(
+                name="max_legs",
+                description=f"Flights per itinerary, at most {MAX_ITINERARY_LEGS} (ex. ?max_legs=2)",
+                type=OpenApiTypes.INT
+            ),
+        ],
+        responses={status.HTTP_200_OK: ItinerarySerializer(many=True)}
+    )
+    @action(methods=["GET"], detail=False, url_path="itineraries")
+    def itineraries(self, request):
+        params = request.query_params
+        airports = dict(
+            Airport.objects.filter(
+                iata_code__in=[params.get("airport_from", "").upper(), params.get("airport_to", "").upper()]
+            ).values_list("iata_code", "pk")
+        )
+        origin_id = airports.get(params.get("airport_from", "").upper())
+        destination_id = airports.get(params.get("airport_to", "").upper())
+        if origin_id is None or destination_id is None:
+            raise ParseError("airport_from and airport_to must be IATA codes of known airports")
+        if origin_id == destination_id:
+            raise ParseError("airport_from and airport_to must be different airports")
+        try:
+            day = datetime.strptime(params["date"], "%Y-%m-%d")
+            k = int(params.get("k", 3))
+            max_legs = int(params.get("max_legs", 3))
+        except (KeyError, ValueError):
+            raise ParseError("date must be formatted as YYYY-MM-DD, k and max_legs must be numbers")
+        if not (1 <= k <= MAX_ITINERARIES and 1 <= max_legs <= MAX_ITINERARY_LEGS):
+            raise ParseError(f"k must be from 1 to {MAX_ITINERARIES} and max_legs from 1 to {MAX_ITINERARY_LEGS}")
+
+        earliest = timezone.make_aware(day)
+        itineraries = get_flight_graph().search(
+            origin_id, destination_id, earliest, earliest + timedelta(days=1), k=k, max_legs=max_legs
+        )
+
+        flights = super().get_queryset().in_bulk(
+            [flight_id for _, _, flight_ids in itineraries for flight_id in flight_ids]
+        )
+        data = [
+            {
+                "departure_time": departure,
+                "arrival_time": arrival,
+                "connections": len(flight_ids) - 1,
+                "flights": [flights[flight_id] for flight_id in flight_ids],
+            }
+            for departure, arrival, flight_ids in itineraries
+            # the graph may still hold a flight deleted by another process
+            if all(flight_id in flights for flight_id in flight_ids)
+        ]
+        return Response(ItinerarySerializer(data, many=True).data)
+
+    @extend_schema(
+        description="Hold a seat for a few minutes before ordering it (POST) or release the hold (DELETE). "
+                    "A user holds a limited number of seats of a flight at a time.",
+        request=SeatHoldSerializer,
+        responses={status.HTTP_201_CREATED: SeatHoldSerializer}
+    )
+    @action(
+        methods=["POST", "DELETE"],
+        detail=True,
+        url_path="holds",
+        permission_classes=[IsAuthenticated],
+    )
+    def holds(self, request, pk=None):
+        flight = self.get_object()
+        # a seat is released whatever happened to it since, only a new hold needs it free
+        serializer = SeatHoldSerializer(
+            data=request.data, context={"flight": flight, "check_taken": request.method == "POST"}
+        )
+        serializer.is_valid(raise_exception=True)
+        row = serializer.validated_data["row"]
+        seat = serializer.validated_data["seat"]
+        backend = get_seat_hold_backend()
+
+        if request.method == "DELETE":
+            backend.release(flight.pk, [(row, seat)], request.user.pk)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        expires_at = timezone.now() + get_hold_ttl()
+        try:
+            held = backend.hold(
+                flight.pk, row, seat, request.user.pk, expires_at, limit=get_max_holds_per_user()
+            )
+        except HoldLimitExceeded as exc:
+            return Response({"seat": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if not held:
+            return Response(Ticket.get_held_error(row, seat), status=status.HTTP_400_BAD_REQUEST)
+        ensure_sweeper_started()
+
+        return Response(
+            {"row": row, "seat": seat, "expires_at": expires_at},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class OrderPagination(KeysetCursorPagination):
+    ordering = ("-created_at", "-id")
 
 
 class OrderViewSet(
@@ -409,6 +858,13 @@ class AllocateTicketAPIView(GenericAPIView):
 
    @extend_schema(
         description="Allocate seat for a ticket by providing row and seat parameters.",
+        parameters=[
+            OpenApiParameter(
+                name="group",
+                description="Seat all unseated tickets of the ticket's order together (ex. ?group=true)",
+                type=OpenApiTypes.BOOL
+            )
+        ],
         # request={
         #     "type": "object",
         #     "properties": {
@@ -428,6 +884,12 @@ class AllocateTicketAPIView(GenericAPIView):
         if ticket.type == "completed":
             return Response({"error": "Ticket is already allocated"}, status=status.HTTP_400_BAD_REQUEST)
 
+        if request.query_params.get("group") in ("1", "true"):
+            tickets = ticket.allocate_order_seats()
+
+            serializer = TicketSerializer(tickets, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
         ticket.allocate_seat()
 
         serializer = TicketSerializer(ticket)